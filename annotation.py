@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+from typing import List, Dict, Tuple, Iterable, Optional, Union
+
+from landmarks import LandmarkSet, HAND_CONNECTIONS
+from startup_profile import lazy_import
+
+mp = lazy_import("mediapipe")
+
+
+class LandmarkAnnotator:
+    def __init__(
+        self,
+        connections: Iterable[Tuple[int, int]],
+        line_color: Tuple[int, int, int] = (224, 224, 224),
+        joint_color: Tuple[int, int, int] = (0, 0, 255),
+        line_thickness: int = 2,
+        joint_radius: int = 2
+    ):
+        self.connections = np.array(sorted(connections), dtype=np.intp).reshape(-1, 2)
+        self.line_color = line_color
+        self.joint_color = np.array(joint_color, dtype=np.uint8)
+        self.line_thickness = line_thickness
+        dy, dx = np.mgrid[-joint_radius:joint_radius + 1, -joint_radius:joint_radius + 1]
+        disk = dx ** 2 + dy ** 2 <= joint_radius ** 2
+        self._disk = np.stack([dx[disk], dy[disk]], axis=1)
+
+    @classmethod
+    def for_hands(cls, **kwargs) -> "LandmarkAnnotator":
+        return cls(HAND_CONNECTIONS, **kwargs)
+
+    @classmethod
+    def for_faces(cls, **kwargs) -> "LandmarkAnnotator":
+        return cls(mp.solutions.face_mesh.FACEMESH_CONTOURS, joint_radius=0, **kwargs)
+
+    def draw(self, image: np.ndarray, landmarks: LandmarkSet) -> np.ndarray:
+        if not len(landmarks):
+            return image
+
+        h, w = image.shape[:2]
+        pixels = np.rint(landmarks.xy * (w, h)).astype(np.int32)
+
+        if len(self.connections):
+            segments = pixels[:, self.connections].reshape(-1, 2, 2)
+            cv2.polylines(image, segments, False, self.line_color, self.line_thickness)
+
+        joints = (pixels.reshape(-1, 1, 2) + self._disk).reshape(-1, 2)
+        inside = (joints[:, 0] >= 0) & (joints[:, 0] < w) & (joints[:, 1] >= 0) & (joints[:, 1] < h)
+        joints = joints[inside]
+        image[joints[:, 1], joints[:, 0]] = self.joint_color
+
+        return image
+
+
+class DetectionAnnotator:
+    def __init__(
+        self,
+        color: Tuple[int, int, int] = (0, 255, 0),
+        thickness: int = 2,
+        show_labels: bool = True,
+        class_names: Optional[Dict[int, str]] = None
+    ):
+        self.class_names = class_names or {}
+        self.color = color
+        self.thickness = thickness
+        self.show_labels = show_labels
+
+    def draw(self, image: np.ndarray, detections: Union[List[Dict], np.ndarray]) -> np.ndarray:
+        if not len(detections):
+            return image
+
+        if isinstance(detections, np.ndarray):
+            boxes = detections['bbox'].astype(np.int32)
+            names = [self.class_names.get(c, str(c)) for c in detections['class_id'].tolist()]
+            scores = detections['confidence'].tolist()
+        else:
+            boxes = np.array([d['bbox'] for d in detections], dtype=np.float32).astype(np.int32)
+            names = [d['class_name'] for d in detections]
+            scores = [d['confidence'] for d in detections]
+
+        corners = boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 4, 2)
+        cv2.polylines(image, corners, True, self.color, self.thickness)
+
+        if self.show_labels:
+            for (x1, y1, _, _), name, score in zip(boxes.tolist(), names, scores):
+                label = f"{name}: {score:.2f}"
+                cv2.putText(
+                    image, label, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, self.color, 2
+                )
+
+        return image
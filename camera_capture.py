@@ -1,16 +1,130 @@
 import cv2
 import numpy as np
-from typing import Optional, Tuple
-import pyrealsense2 as rs
+import threading
+import time
+from typing import Optional, Tuple, Dict, List
+
+from frame_sources import open_source
+from session_recorder import SessionRecorder
+from startup_profile import lazy_import
+
+rs = lazy_import("pyrealsense2")
+
+
+class FrameRingBuffer:
+    def __init__(self, capacity: int = 2, drop_policy: str = "latest"):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if drop_policy not in ("latest", "fifo"):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.capacity = capacity
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self.closed = False
+        self._slots: List[Dict] = [self._empty_slot() for _ in range(capacity)]
+        self._reader = self._empty_slot()
+        self._head = 0
+        self._count = 0
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def _empty_slot() -> Dict:
+        return {'color': None, 'depth': None, 'timestamp': 0.0, 'sequence': -1}
+
+    @staticmethod
+    def _store(slot: Dict, key: str, image: Optional[np.ndarray]):
+        if image is None:
+            slot[key] = None
+            return
+        target = slot[key]
+        if target is None or target.shape != image.shape or target.dtype != image.dtype:
+            slot[key] = np.empty_like(image)
+        np.copyto(slot[key], image)
+
+    def put(
+        self,
+        color: np.ndarray,
+        depth: Optional[np.ndarray],
+        timestamp: float,
+        sequence: int
+    ):
+        with self._cond:
+            if self.drop_policy == "fifo":
+                self._cond.wait_for(lambda: self._count < self.capacity or self.closed)
+                if self.closed:
+                    return
+            elif self._count == self.capacity:
+                self._head = (self._head + 1) % self.capacity
+                self._count -= 1
+                self.dropped += 1
+
+            slot = self._slots[(self._head + self._count) % self.capacity]
+            self._store(slot, 'color', color)
+            self._store(slot, 'depth', depth)
+            slot['timestamp'] = timestamp
+            slot['sequence'] = sequence
+            self._count += 1
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._count > 0 or self.closed, timeout):
+                return None
+            if self._count == 0:
+                return None
+
+            if self.drop_policy == "latest":
+                idx = (self._head + self._count - 1) % self.capacity
+                self.dropped += self._count - 1
+                self._head = (idx + 1) % self.capacity
+                self._count = 0
+            else:
+                idx = self._head
+                self._head = (self._head + 1) % self.capacity
+                self._count -= 1
+
+            self._slots[idx], self._reader = self._reader, self._slots[idx]
+            self._cond.notify_all()
+            return self._reader
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
 
 
 class CameraCapture:
-    def __init__(self, use_realsense: bool = False, camera_index: int = 0):
+    def __init__(
+        self,
+        use_realsense: bool = False,
+        camera_index: int = 0,
+        source: Optional[str] = None,
+        realtime: bool = False,
+        threaded: bool = False,
+        buffer_size: int = 2,
+        drop_policy: str = "latest"
+    ):
         self.use_realsense = use_realsense
         self.camera_index = camera_index
+        self.source = None
+        self.threaded = threaded
         self.pipeline = None
         self.pipeline_profile = None
-        self._initialize_camera()
+        self.sequence = 0
+        self.last_timestamp = 0.0
+        self.recorder = None
+        self._record_lock = threading.Lock()
+        self._buffer = None
+        self._thread = None
+        self._running = False
+        if source is not None:
+            self.source = open_source(source, realtime=realtime)
+        else:
+            self._initialize_camera()
+
+        if threaded:
+            self._buffer = FrameRingBuffer(buffer_size, drop_policy)
+            self._start_capture_thread()
 
     def _initialize_camera(self):
         if self.use_realsense:
@@ -32,11 +146,86 @@ class CameraCapture:
         if not self.cap.isOpened():
             raise RuntimeError(f"Cannot open camera at index {self.camera_index}")
 
-    def get_frame(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
-        if self.use_realsense:
-            return self._get_realsense_frame()
+    def _start_capture_thread(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+
+    def _capture_loop(self):
+        try:
+            while self._running:
+                color_image, depth_image = self._read_frame()
+                if color_image is None:
+                    break
+                self._buffer.put(color_image, depth_image, time.perf_counter(), self.sequence)
+                self.sequence += 1
+        finally:
+            self._buffer.close()
+
+    def _read_frame(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        if self.source is not None:
+            color_image, depth_image = self.source.get_frame()
+        elif self.use_realsense:
+            color_image, depth_image = self._get_realsense_frame()
         else:
-            return self._get_webcam_frame(), None
+            color_image, depth_image = self._get_webcam_frame(), None
+
+        if self.recorder is not None and color_image is not None and depth_image is not None:
+            with self._record_lock:
+                if self.recorder is not None:
+                    self.recorder.write(color_image, depth_image)
+
+        return color_image, depth_image
+
+    def start_recording(self, path: str, **kwargs):
+        if not self.has_depth:
+            raise RuntimeError("Recording requires a color+depth stream")
+        self.stop_recording()
+        recorder = SessionRecorder(path, intrinsics=self.get_intrinsics(), **kwargs)
+        with self._record_lock:
+            self.recorder = recorder
+
+    def stop_recording(self):
+        with self._record_lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def get_frame(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        packet = self.get_frame_packet()
+        if packet is None:
+            return None, None
+        return packet['color'], packet['depth']
+
+    def get_frame_packet(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        if self.threaded:
+            packet = self._buffer.get(timeout)
+            if packet is not None:
+                self.last_timestamp = packet['timestamp']
+            return packet
+
+        color_image, depth_image = self._read_frame()
+        if color_image is None:
+            return None
+        self.last_timestamp = time.perf_counter()
+        packet = {
+            'color': color_image,
+            'depth': depth_image,
+            'timestamp': self.last_timestamp,
+            'sequence': self.sequence
+        }
+        self.sequence += 1
+        return packet
+
+    @property
+    def has_depth(self) -> bool:
+        if self.source is not None:
+            return self.source.has_depth
+        return self.use_realsense
+
+    @property
+    def dropped_frames(self) -> int:
+        return self._buffer.dropped if self._buffer else 0
 
     def _get_realsense_frame(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
         frames = self.pipeline.wait_for_frames()
@@ -58,21 +247,55 @@ class CameraCapture:
         return frame
 
     def get_intrinsics(self) -> Optional[dict]:
+        if self.source is not None:
+            return self.source.get_intrinsics()
+        if self.use_realsense and self.pipeline_profile:
+            return self._stream_intrinsics(rs.stream.depth)
+        return None
+
+    def get_color_intrinsics(self) -> Optional[dict]:
         if self.use_realsense and self.pipeline_profile:
-            depth_stream = self.pipeline_profile.get_stream(rs.stream.depth)
-            intrinsics = depth_stream.as_video_stream_profile().get_intrinsics()
-            return {
-                'fx': intrinsics.fx,
-                'fy': intrinsics.fy,
-                'cx': intrinsics.ppx,
-                'cy': intrinsics.ppy,
-                'width': intrinsics.width,
-                'height': intrinsics.height
-            }
+            return self._stream_intrinsics(rs.stream.color)
         return None
 
+    def get_calibration(self) -> Optional[dict]:
+        if self.source is not None or not (self.use_realsense and self.pipeline_profile):
+            return None
+
+        depth_stream = self.pipeline_profile.get_stream(rs.stream.depth)
+        color_stream = self.pipeline_profile.get_stream(rs.stream.color)
+        extrinsics = depth_stream.get_extrinsics_to(color_stream)
+        depth_sensor = self.pipeline_profile.get_device().first_depth_sensor()
+        return {
+            'depth': self._stream_intrinsics(rs.stream.depth),
+            'color': self._stream_intrinsics(rs.stream.color),
+            'rotation': np.asarray(extrinsics.rotation).reshape(3, 3).T.tolist(),
+            'translation': list(extrinsics.translation),
+            'depth_units': depth_sensor.get_depth_scale()
+        }
+
+    def _stream_intrinsics(self, stream) -> dict:
+        profile = self.pipeline_profile.get_stream(stream)
+        intrinsics = profile.as_video_stream_profile().get_intrinsics()
+        return {
+            'fx': intrinsics.fx,
+            'fy': intrinsics.fy,
+            'cx': intrinsics.ppx,
+            'cy': intrinsics.ppy,
+            'width': intrinsics.width,
+            'height': intrinsics.height
+        }
+
     def release(self):
-        if self.use_realsense and self.pipeline:
+        if self._thread is not None:
+            self._running = False
+            self._buffer.close()
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.stop_recording()
+        if self.source is not None:
+            self.source.release()
+        elif self.use_realsense and self.pipeline:
             self.pipeline.stop()
         elif hasattr(self, 'cap'):
             self.cap.release()
@@ -1,5 +1,9 @@
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
+
+from depth_estimation import DepthPrediction
+from depth_registration import DepthRegistration
+from landmarks import LandmarkSet
 
 
 class CoordinateConverter:
@@ -8,15 +12,38 @@ class CoordinateConverter:
         intrinsics: Optional[Dict] = None,
         depth_scale: float = 1.0,
         camera_height: float = 0.5,
-        focal_length: float = 600.0
+        focal_length: float = 600.0,
+        depth_window: int = 1,
+        fallback_window: Optional[int] = None,
+        registration: Optional[DepthRegistration] = None
     ):
         self.intrinsics = intrinsics or {}
         self.depth_scale = depth_scale
         self.camera_height = camera_height
         self.focal_length = focal_length
+        self.depth_window = depth_window
+        self.fallback_window = fallback_window or depth_window * 3
+        self.registration = registration
+        self._window_sampler = None
+        self._rays = None
+        self._rays_key = None
+        self._cloud_buffer = None
+        self._depth_buffer = None
 
     def set_intrinsics(self, fx: float, fy: float, cx: float, cy: float):
         self.intrinsics = {'fx': fx, 'fy': fy, 'cx': cx, 'cy': cy}
+        self._rays = None
+        self._rays_key = None
+
+    def _camera_params(self) -> Tuple[float, float, float, float]:
+        if not self.intrinsics:
+            return self.focal_length, self.focal_length, 320, 320
+        return (
+            self.intrinsics.get('fx', self.focal_length),
+            self.intrinsics.get('fy', self.focal_length),
+            self.intrinsics.get('cx', 320),
+            self.intrinsics.get('cy', 240)
+        )
 
     def pixel_to_3d(
         self,
@@ -25,14 +52,7 @@ class CoordinateConverter:
         depth: float,
         scale_factor: float = 1.0
     ) -> Tuple[float, float, float]:
-        if not self.intrinsics:
-            fx = fy = self.focal_length
-            cx = cy = 320
-        else:
-            fx = self.intrinsics.get('fx', self.focal_length)
-            fy = self.intrinsics.get('fy', self.focal_length)
-            cx = self.intrinsics.get('cx', 320)
-            cy = self.intrinsics.get('cy', 240)
+        fx, fy, cx, cy = self._camera_params()
 
         z = depth * scale_factor
         x = (u - cx) * z / fx
@@ -40,78 +60,286 @@ class CoordinateConverter:
 
         return x, y, z
 
+    def unproject(
+        self,
+        pixels: np.ndarray,
+        depths: np.ndarray,
+        scale_factor: float = 1.0
+    ) -> np.ndarray:
+        fx, fy, cx, cy = self._camera_params()
+        pixels = np.asarray(pixels, dtype=np.float32).reshape(-1, 2)
+
+        points = np.empty((len(pixels), 3), dtype=np.float32)
+        points[:, 2] = depths
+        points[:, 2] *= scale_factor
+        points[:, 0] = (pixels[:, 0] - cx) * points[:, 2] / fx
+        points[:, 1] = (pixels[:, 1] - cy) * points[:, 2] / fy
+
+        return points
+
+    def sample_depth(
+        self,
+        pixels: np.ndarray,
+        depth_map: Optional[Union[np.ndarray, DepthPrediction]] = None,
+        depth_frame: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        pixels = np.asarray(pixels, dtype=np.float32).reshape(-1, 2)
+
+        if depth_frame is not None and self.registration is not None:
+            radius = max(self.depth_window, self.fallback_window) // 2 + 1 if self.depth_window > 1 else 1
+            depth_frame = self.registration.align_around(depth_frame, pixels, radius)
+
+        if depth_frame is not None and self.depth_window > 1:
+            depths = self._sample_window(depth_frame, pixels)
+            depths *= self.depth_scale / 1000.0
+        elif depth_frame is not None:
+            depths = _bilinear_sample(depth_frame, pixels, skip_zeros=True)
+            depths *= self.depth_scale / 1000.0
+        elif isinstance(depth_map, DepthPrediction):
+            h, w = depth_map.shape
+            depths = depth_map.sample(pixels / np.float32((w, h))) * 5.0
+        elif depth_map is not None:
+            depths = _bilinear_sample(depth_map, pixels) * (5.0 / 255.0)
+        else:
+            return np.ones(len(pixels), dtype=np.float32)
+
+        return np.where(np.isnan(depths), 1.0, depths).astype(np.float32)
+
+    def _sample_window(self, depth_frame: np.ndarray, pixels: np.ndarray) -> np.ndarray:
+        if self._window_sampler is None or self._window_sampler.depth is not depth_frame:
+            self._window_sampler = WindowedDepthSampler(depth_frame)
+        sampler = self._window_sampler
+
+        depths = sampler.mean(pixels, self.depth_window)
+        empty = depths == 0
+        if empty.any():
+            depths[empty] = sampler.mean(pixels[empty], self.fallback_window)
+        empty = depths == 0
+        if empty.any():
+            depths[empty] = _bilinear_sample(depth_frame, pixels[empty], skip_zeros=True)
+        depths[depths == 0] = np.nan
+        return depths
+
+    def convert_points(
+        self,
+        points: np.ndarray,
+        depth_map: Optional[Union[np.ndarray, DepthPrediction]] = None,
+        depth_frame: Optional[np.ndarray] = None,
+        image_width: int = 640,
+        image_height: int = 480,
+        normalized: bool = True
+    ) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float32)
+        pixels = points.reshape(-1, points.shape[-1])[:, :2]
+        if normalized:
+            pixels = pixels * np.float32((image_width, image_height))
+
+        depths = self.sample_depth(pixels, depth_map, depth_frame)
+        return self.unproject(pixels, depths)
+
+    def convert_detections(
+        self,
+        detections: Union[List[Dict], LandmarkSet, np.ndarray],
+        depth_map: Optional[Union[np.ndarray, DepthPrediction]] = None,
+        depth_frame: Optional[np.ndarray] = None,
+        image_width: int = 640,
+        image_height: int = 480
+    ) -> np.ndarray:
+        pixels, _ = _detection_pixels(detections, image_width, image_height)
+        return self.convert_points(
+            pixels, depth_map, depth_frame, image_width, image_height, normalized=False
+        )
+
     def convert_2d_to_3d(
         self,
-        points_2d: List[Dict],
-        depth_map: Optional[np.ndarray] = None,
+        points_2d: Union[List[Dict], LandmarkSet, np.ndarray],
+        depth_map: Optional[Union[np.ndarray, DepthPrediction]] = None,
         depth_frame: Optional[np.ndarray] = None,
         image_width: int = 640,
         image_height: int = 480
     ) -> List[Dict]:
-        points_3d = []
-
-        for point in points_2d:
-            if 'x' in point and 'y' in point:
-                u = point['x'] * image_width
-                v = point['y'] * image_height
-            elif 'bbox' in point:
-                u = point['center'][0]
-                v = point['center'][1]
-            else:
-                continue
-
-            if depth_frame is not None:
-                depth = self._get_depth_from_realsense(depth_frame, int(u), int(v))
-            elif depth_map is not None:
-                depth = self._get_depth_from_midas(depth_map, int(u), int(v))
-            else:
-                depth = 1.0
-
-            x, y, z = self.pixel_to_3d(u, v, depth)
-
-            points_3d.append({
-                'x': x,
-                'y': y,
-                'z': z,
-                'original_2d': point
-            })
-
-        return points_3d
-
-    def _get_depth_from_realsense(
+        pixels, originals = _detection_pixels(points_2d, image_width, image_height)
+        points = self.convert_points(
+            pixels, depth_map, depth_frame, image_width, image_height, normalized=False
+        )
+
+        return [
+            {'x': x, 'y': y, 'z': z, 'original_2d': point}
+            for (x, y, z), point in zip(points.tolist(), originals)
+        ]
+
+    def ray_table(self, height: int, width: int, stride: int = 1) -> np.ndarray:
+        fx, fy, cx, cy = self._camera_params()
+        key = (height, width, stride, fx, fy, cx, cy)
+        if self._rays_key != key:
+            u = np.arange(0, width, stride, dtype=np.float32)
+            v = np.arange(0, height, stride, dtype=np.float32)
+            rays = np.empty((len(v), len(u), 3), dtype=np.float32)
+            rays[:, :, 0] = (u - cx) / fx
+            rays[:, :, 1] = ((v - cy) / fy)[:, None]
+            rays[:, :, 2] = 1.0
+            self._rays = rays.reshape(-1, 3)
+            self._rays_key = key
+        return self._rays
+
+    def depth_to_point_cloud(
         self,
         depth_frame: np.ndarray,
-        x: int,
-        y: int
-    ) -> float:
-        h, w = depth_frame.shape
-        if 0 <= x < w and 0 <= y < h:
-            return float(depth_frame[y, x]) * self.depth_scale / 1000.0
-        return 1.0
-
-    def _get_depth_from_midas(
-        self,
-        depth_map: np.ndarray,
-        x: int,
-        y: int
-    ) -> float:
-        h, w = depth_map.shape
-        if 0 <= x < w and 0 <= y < h:
-            return float(depth_map[y, x]) / 255.0 * 5.0
-        return 1.0
+        stride: int = 1,
+        skip_invalid: bool = True,
+        return_mask: bool = False
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        h, w = depth_frame.shape[:2]
+        rays = self.ray_table(h, w, stride)
+
+        decimated = depth_frame[::stride, ::stride]
+        if self._cloud_buffer is None or len(self._cloud_buffer) < len(rays):
+            self._cloud_buffer = np.empty_like(rays)
+            self._depth_buffer = np.empty(len(rays), dtype=np.float32)
+
+        depths = self._depth_buffer[:len(rays)]
+        np.multiply(decimated, self.depth_scale / 1000.0, out=depths.reshape(decimated.shape), dtype=np.float32)
+
+        if skip_invalid:
+            indices = np.flatnonzero(depths)
+            points = self._cloud_buffer[:len(indices)]
+            np.take(rays, indices, axis=0, out=points, mode="clip")
+            valid_depths = depths[:len(indices)]
+            np.take(depths, indices, out=valid_depths, mode="clip")
+            points *= valid_depths[:, None]
+        else:
+            indices = None
+            points = self._cloud_buffer[:len(rays)]
+            np.multiply(rays, depths[:, None], out=points)
+
+        if return_mask:
+            valid = np.ones(len(rays), dtype=bool)
+            if indices is not None:
+                valid[:] = False
+                valid[indices] = True
+            return points, valid
+        return points
 
     def create_point_cloud(
         self,
-        points_3d: List[Dict],
+        points_3d: Union[List[Dict], np.ndarray],
         colors: Optional[List[Tuple[int, int, int]]] = None
     ) -> Tuple[np.ndarray, np.ndarray]:
-        num_points = len(points_3d)
-        points = np.zeros((num_points, 3))
-        point_colors = np.zeros((num_points, 3))
+        if isinstance(points_3d, np.ndarray):
+            points = points_3d.reshape(-1, 3).astype(np.float64)
+        else:
+            points = np.array(
+                [[point['x'], point['y'], point['z']] for point in points_3d],
+                dtype=np.float64
+            ).reshape(-1, 3)
 
-        for i, point in enumerate(points_3d):
-            points[i] = [point['x'], point['y'], point['z']]
-            if colors and i < len(colors):
-                point_colors[i] = [c / 255.0 for c in colors[i]]
+        point_colors = np.zeros((len(points), 3))
+        if colors:
+            count = min(len(colors), len(points))
+            point_colors[:count] = np.asarray(colors[:count], dtype=np.float64) / 255.0
 
         return points, point_colors
+
+
+class WindowedDepthSampler:
+    def __init__(self, depth: np.ndarray):
+        self.depth = depth
+        h, w = depth.shape[:2]
+
+        self.sums = np.zeros((h + 1, w + 1), dtype=np.float64)
+        self.counts = np.zeros((h + 1, w + 1), dtype=np.int32)
+        np.cumsum(depth, axis=0, dtype=np.float64, out=self.sums[1:, 1:])
+        np.cumsum(self.sums[1:, 1:], axis=1, out=self.sums[1:, 1:])
+        np.cumsum(depth > 0, axis=0, dtype=np.int32, out=self.counts[1:, 1:])
+        np.cumsum(self.counts[1:, 1:], axis=1, out=self.counts[1:, 1:])
+
+    def mean(self, pixels: np.ndarray, window: int) -> np.ndarray:
+        h, w = self.depth.shape[:2]
+        pixels = np.asarray(pixels, dtype=np.float32).reshape(-1, 2)
+        u = pixels[:, 0]
+        v = pixels[:, 1]
+        inside = (u >= 0) & (u < w) & (v >= 0) & (v < h)
+
+        half = window // 2
+        x = u.astype(np.intp)
+        y = v.astype(np.intp)
+        x0 = np.clip(x - half, 0, w)
+        x1 = np.clip(x - half + window, 0, w)
+        y0 = np.clip(y - half, 0, h)
+        y1 = np.clip(y - half + window, 0, h)
+
+        total = self.sums[y1, x1] - self.sums[y0, x1] - self.sums[y1, x0] + self.sums[y0, x0]
+        count = self.counts[y1, x1] - self.counts[y0, x1] - self.counts[y1, x0] + self.counts[y0, x0]
+
+        means = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+        return np.where(inside, means, np.nan).astype(np.float32)
+
+
+def _detection_pixels(
+    detections: Union[List[Dict], LandmarkSet, np.ndarray],
+    image_width: int,
+    image_height: int
+) -> Tuple[np.ndarray, List]:
+    if isinstance(detections, LandmarkSet):
+        detections = detections.points
+
+    if isinstance(detections, np.ndarray):
+        if detections.dtype.names and 'bbox' in detections.dtype.names:
+            boxes = detections['bbox'].reshape(-1, 4)
+            pixels = (boxes[:, :2] + boxes[:, 2:]) / 2
+            return pixels.astype(np.float32), list(detections.reshape(-1))
+        rows = detections.reshape(-1, detections.shape[-1])
+        pixels = rows[:, :2] * np.float32((image_width, image_height))
+        return pixels.astype(np.float32), list(rows)
+
+    pixels = []
+    originals = []
+    for point in detections:
+        if 'x' in point and 'y' in point:
+            pixels.append((point['x'] * image_width, point['y'] * image_height))
+        elif 'bbox' in point:
+            pixels.append((point['center'][0], point['center'][1]))
+        else:
+            continue
+        originals.append(point)
+
+    return np.asarray(pixels, dtype=np.float32).reshape(-1, 2), originals
+
+
+def _bilinear_sample(
+    image: np.ndarray,
+    pixels: np.ndarray,
+    skip_zeros: bool = False
+) -> np.ndarray:
+    h, w = image.shape[:2]
+    u = pixels[:, 0]
+    v = pixels[:, 1]
+    inside = (u >= 0) & (u < w) & (v >= 0) & (v < h)
+
+    px = np.clip(u - 0.5, 0, w - 1)
+    py = np.clip(v - 0.5, 0, h - 1)
+    x0 = px.astype(np.intp)
+    y0 = py.astype(np.intp)
+    x1 = np.minimum(x0 + 1, w - 1)
+    y1 = np.minimum(y0 + 1, h - 1)
+    fx = px - x0
+    fy = py - y0
+
+    corners = np.stack([
+        image[y0, x0], image[y0, x1], image[y1, x0], image[y1, x1]
+    ]).astype(np.float32)
+    weights = np.stack([
+        (1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy
+    ])
+
+    if skip_zeros:
+        weights *= corners > 0
+        total = weights.sum(axis=0)
+        values = np.divide(
+            (corners * weights).sum(axis=0), total,
+            out=np.zeros_like(total), where=total > 0
+        )
+    else:
+        values = (corners * weights).sum(axis=0)
+
+    return np.where(inside, values, np.nan).astype(np.float32)
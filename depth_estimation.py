@@ -1,56 +1,528 @@
+import argparse
 import cv2
+import json
+import os
+import sys
+import threading
+import time
 import numpy as np
-import torch
-from typing import Optional
-from torchvision.transforms import Compose, Resize, Normalize, ToTensor
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union, List, Dict, Iterable, Iterator
+
+from frame_sources import open_source
+from frame_scaling import ScaledFrame, InferenceResolution, as_scaled_frame, round_to_stride
+from startup_profile import lazy_import
+
+torch = lazy_import("torch")
+onnxruntime = lazy_import("onnxruntime")
+
+
+class DepthPrediction:
+    def __init__(
+        self,
+        prediction: np.ndarray,
+        image_shape: Tuple[int, int],
+        offset: Tuple[float, float] = (0.0, 0.0)
+    ):
+        self.prediction = prediction
+        self.image_shape = image_shape
+        self.offset = offset
+        self.min = float(prediction.min())
+        self.scale = 1.0 / (float(prediction.max()) - self.min + 1e-8)
+        self._map = None
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.image_shape
+
+    def shifted(self, dx: float, dy: float) -> "DepthPrediction":
+        offset = (self.offset[0] + dx, self.offset[1] + dy)
+        return DepthPrediction(self.prediction, self.image_shape, offset)
+
+    def sample(self, xy: np.ndarray) -> np.ndarray:
+        xy = np.asarray(xy, dtype=np.float32).reshape(-1, 2)
+        x = xy[:, 0] - self.offset[0]
+        y = xy[:, 1] - self.offset[1]
+        inside = (xy[:, 0] >= 0) & (xy[:, 0] < 1) & (xy[:, 1] >= 0) & (xy[:, 1] < 1)
+
+        h, w = self.prediction.shape
+        px = np.clip(x * w - 0.5, 0, w - 1)
+        py = np.clip(y * h - 0.5, 0, h - 1)
+        x0 = np.minimum(px.astype(np.intp), w - 2)
+        y0 = np.minimum(py.astype(np.intp), h - 2)
+        x1 = x0 + 1
+        y1 = y0 + 1
+        fx = px - x0
+        fy = py - y0
+
+        p = self.prediction
+        top = p[y0, x0] * (1 - fx) + p[y0, x1] * fx
+        bottom = p[y1, x0] * (1 - fx) + p[y1, x1] * fx
+        depth = ((top * (1 - fy) + bottom * fy) - self.min) * self.scale
+
+        return np.where(inside, depth, np.nan).astype(np.float32)
+
+    def to_map(self) -> np.ndarray:
+        if self._map is None:
+            h, w = self.image_shape
+            normalized = (self.prediction - self.min) * self.scale
+            depth_map = cv2.resize(normalized, (w, h), interpolation=cv2.INTER_CUBIC)
+            depth_map = (np.clip(depth_map, 0, 1) * 255).astype(np.uint8)
+            dx, dy = self.offset
+            if dx or dy:
+                shift = np.float32([[1, 0, dx * w], [0, 1, dy * h]])
+                depth_map = cv2.warpAffine(
+                    depth_map, shift, (w, h),
+                    flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_REPLICATE
+                )
+            self._map = depth_map
+        return self._map
+
+
+MODEL_CONFIGS = {
+    "DPT_Large": {'input_size': 384, 'mean': [0.5, 0.5, 0.5], 'std': [0.5, 0.5, 0.5]},
+    "DPT_Hybrid": {'input_size': 384, 'mean': [0.5, 0.5, 0.5], 'std': [0.5, 0.5, 0.5]},
+    "MiDaS": {'input_size': 384, 'mean': [0.485, 0.456, 0.406], 'std': [0.229, 0.224, 0.225]},
+    "MiDaS_small": {'input_size': 256, 'mean': [0.485, 0.456, 0.406], 'std': [0.229, 0.224, 0.225]},
+}
+
+MODEL_METADATA = "depth_model.json"
+
+PRECISIONS = ("fp32", "bf16", "int8")
 
 
 class DepthEstimator:
-    def __init__(self, model_type: str = "DPT_Large"):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    def __init__(
+        self,
+        model_type: str = "DPT_Large",
+        inference_size: Optional[Tuple[int, int]] = None,
+        inference_scale: Optional[float] = None,
+        model_dir: Optional[str] = None,
+        num_threads: Optional[int] = None,
+        warmup: bool = True,
+        precision: str = "fp32"
+    ):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        self.resolution = InferenceResolution(inference_size, inference_scale)
+        self.precision = precision
+        use_cuda = torch.cuda.is_available() and precision != "int8"
+        self.device = torch.device("cuda" if use_cuda else "cpu")
         self.model = None
-        self.transform = None
-        self._load_model(model_type)
+        self.session = None
+        self.config = None
+        configure_threads(num_threads)
 
-    def _load_model(self, model_type: str):
-        if model_type == "DPT_Large":
-            self.model = torch.hub.load("intel-isl/MiDaS", "DPT_Large")
-        elif model_type == "DPT_Hybrid":
-            self.model = torch.hub.load("intel-isl/MiDaS", "DPT_Hybrid")
+        if model_dir is not None:
+            self._load_exported(model_dir)
         else:
-            self.model = torch.hub.load("intel-isl/MiDaS", "MiDaS")
+            self._load_model(model_type)
+        self.input_size = self._network_size()
+
+        if warmup:
+            self.warmup()
 
+    def _load_model(self, model_type: str):
+        if model_type not in MODEL_CONFIGS:
+            raise ValueError(f"Unknown MiDaS model type: {model_type}")
+
+        self.model = torch.hub.load("intel-isl/MiDaS", model_type)
         self.model.to(self.device)
         self.model.eval()
+        if self.precision == "int8":
+            self.model = quantize_model(self.model)
+        self.config = dict(MODEL_CONFIGS[model_type], model_type=model_type)
 
-        self.transform = Compose([
-            Resize((384, 384)),
-            ToTensor(),
-            Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+    def _load_exported(self, model_dir: str):
+        with open(os.path.join(model_dir, MODEL_METADATA)) as f:
+            self.config = json.load(f)
 
-    def estimate_depth(self, image: np.ndarray) -> np.ndarray:
-        img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        input_batch = self.transform(img_rgb).unsqueeze(0).to(self.device)
+        exported_precision = self.config.get('precision', "fp32")
+        if self.precision == "int8" and exported_precision != "int8":
+            raise ValueError("int8 requires a model exported with --precision int8")
+        if exported_precision == "int8":
+            self.device = torch.device("cpu")
 
-        with torch.no_grad():
-            prediction = self.model(input_batch)
+        model_path = os.path.join(model_dir, self.config['file'])
+        if self.config['format'] == "onnx":
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = torch.get_num_threads()
+            self.session = onnxruntime.InferenceSession(
+                model_path, options, providers=["CPUExecutionProvider"]
+            )
+        else:
+            self.model = torch.jit.load(model_path, map_location=self.device)
+            self.model.eval()
+
+    def _network_size(self) -> Tuple[int, int]:
+        base = self.config['input_size']
+        if self.resolution.size is not None:
+            width, height = self.resolution.size
+        elif self.resolution.enabled:
+            width = height = base * self.resolution.scale
+        else:
+            return base, base
+
+        size = round_to_stride(width), round_to_stride(height)
+        if 'format' in self.config and size != (base, base):
+            raise ValueError(
+                f"Exported model has a fixed {base}x{base} input; "
+                f"re-export with --input-size to run at {size[0]}x{size[1]}"
+            )
+        return size
+
+    def preprocess(self, img_rgb: np.ndarray) -> np.ndarray:
+        width, height = self.input_size
+        resized = img_rgb
+        if img_rgb.shape[:2] != (height, width):
+            resized = cv2.resize(img_rgb, (width, height), interpolation=cv2.INTER_CUBIC)
+        mean = np.asarray(self.config['mean'], dtype=np.float32)
+        std = np.asarray(self.config['std'], dtype=np.float32)
+        normalized = (resized.astype(np.float32) / 255.0 - mean) / std
+        return np.ascontiguousarray(normalized.transpose(2, 0, 1), dtype=np.float32)[None]
+
+    def _run(self, input_batch: np.ndarray) -> np.ndarray:
+        if self.session is not None:
+            input_name = self.session.get_inputs()[0].name
+            return self.session.run(None, {input_name: input_batch})[0]
+
+        input_tensor = torch.from_numpy(input_batch).to(self.device)
+        with torch.no_grad(), torch.autocast(
+            device_type=self.device.type, dtype=torch.bfloat16, enabled=self.precision == "bf16"
+        ):
+            prediction = self.model(input_tensor)
+        return prediction.float().cpu().numpy()
+
+    def warmup(self, iterations: int = 1):
+        width, height = self.input_size
+        dummy = np.zeros((1, 3, height, width), dtype=np.float32)
+        for _ in range(iterations):
+            self._run(dummy)
+
+    def _prepare(self, image: Union[np.ndarray, ScaledFrame]) -> Tuple[Tuple[int, int], np.ndarray]:
+        frame = as_scaled_frame(image)
+        inference_image = frame.resized(self.input_size) if self.resolution.enabled else frame.image
+        img_rgb = cv2.cvtColor(inference_image, cv2.COLOR_BGR2RGB)
+        return frame.shape[:2], self.preprocess(img_rgb)
+
+    def predict(self, image: Union[np.ndarray, ScaledFrame]) -> DepthPrediction:
+        image_shape, input_batch = self._prepare(image)
+        prediction = self._run(input_batch)
+        return DepthPrediction(prediction.reshape(prediction.shape[-2:]), image_shape)
 
-        prediction = torch.nn.functional.interpolate(
-            prediction.unsqueeze(1),
-            size=img_rgb.shape[:2],
-            mode="bicubic",
-            align_corners=False
-        ).squeeze()
+    def predict_batches(
+        self,
+        frames: Iterable[Union[np.ndarray, ScaledFrame]],
+        batch_size: int = 8,
+        num_workers: int = 4
+    ) -> Iterator[DepthPrediction]:
+        frames = iter(frames)
+        pending = deque()
 
-        depth_map = prediction.cpu().numpy()
-        depth_map = (depth_map - depth_map.min()) / (depth_map.max() - depth_map.min() + 1e-8)
-        depth_map = (depth_map * 255).astype(np.uint8)
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            while True:
+                while len(pending) < batch_size * 2:
+                    frame = next(frames, None)
+                    if frame is None:
+                        break
+                    pending.append(executor.submit(self._prepare, frame))
 
-        return depth_map
+                if not pending:
+                    return
+
+                batch = [pending.popleft().result() for _ in range(min(batch_size, len(pending)))]
+                predictions = self._run(np.concatenate([inputs for _, inputs in batch]))
+                predictions = predictions.reshape(len(batch), *predictions.shape[-2:])
+
+                for (image_shape, _), prediction in zip(batch, predictions):
+                    yield DepthPrediction(prediction, image_shape)
+
+    def estimate_depth(self, image: Union[np.ndarray, ScaledFrame]) -> np.ndarray:
+        return self.predict(image).to_map()
 
     def get_depth_at_point(self, depth_map: np.ndarray, x: int, y: int) -> float:
         h, w = depth_map.shape
         if 0 <= x < w and 0 <= y < h:
             return float(depth_map[y, x])
         return 0.0
+
+
+def estimate_video_depth(
+    source_path: str,
+    output_path: str,
+    estimator: DepthEstimator,
+    batch_size: int = 8,
+    num_workers: int = 4,
+    full_resolution: bool = False
+) -> np.memmap:
+    source = open_source(source_path)
+    num_frames = len(source)
+    if num_frames == sys.maxsize:
+        raise RuntimeError(f"Cannot determine the frame count of {source_path}")
+
+    first, _ = source.get_frame()
+    if first is None:
+        raise RuntimeError(f"No frames in {source_path}")
+    source.seek(0)
+
+    if full_resolution:
+        shape, dtype = first.shape[:2], np.uint8
+    else:
+        shape, dtype = estimator.input_size[::-1], np.float32
+    output = np.lib.format.open_memmap(output_path, mode='w+', dtype=dtype, shape=(num_frames,) + tuple(shape))
+
+    def frames():
+        while True:
+            color_frame, _ = source.get_frame()
+            if color_frame is None:
+                return
+            yield color_frame
+
+    count = 0
+    try:
+        for prediction in estimator.predict_batches(frames(), batch_size, num_workers):
+            if full_resolution:
+                output[count] = prediction.to_map()
+            else:
+                output[count] = (prediction.prediction - prediction.min) * prediction.scale
+            count += 1
+    finally:
+        source.release()
+
+    output.flush()
+    return output[:count]
+
+
+def configure_threads(num_threads: Optional[int] = None, num_interop_threads: Optional[int] = None):
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            pass
+
+
+def quantize_model(model):
+    return torch.ao.quantization.quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def compare_precisions(
+    frames: List[np.ndarray],
+    precisions: Tuple[str, ...] = ("bf16", "int8"),
+    model_type: str = "DPT_Large",
+    model_dir: Optional[str] = None
+) -> Dict[str, Dict[str, float]]:
+    def run(estimator):
+        start = time.perf_counter()
+        outputs = []
+        for frame in frames:
+            prediction = estimator.predict(frame)
+            outputs.append((prediction.prediction - prediction.min) * prediction.scale)
+        return outputs, (time.perf_counter() - start) * 1000.0 / max(len(frames), 1)
+
+    reference, reference_ms = run(DepthEstimator(model_type, model_dir=model_dir))
+    report = {"fp32": {'ms_per_frame': reference_ms, 'mae': 0.0, 'rmse': 0.0, 'max_error': 0.0}}
+
+    for precision in precisions:
+        outputs, ms = run(DepthEstimator(model_type, model_dir=model_dir, precision=precision))
+        errors = np.concatenate([(out - ref).ravel() for out, ref in zip(outputs, reference)])
+        report[precision] = {
+            'ms_per_frame': ms,
+            'mae': float(np.abs(errors).mean()),
+            'rmse': float(np.sqrt(np.mean(errors ** 2))),
+            'max_error': float(np.abs(errors).max())
+        }
+
+    return report
+
+
+def export_model(
+    model_type: str,
+    output_dir: str,
+    export_format: str = "torchscript",
+    precision: str = "fp32",
+    input_size: Optional[int] = None
+) -> str:
+    if model_type not in MODEL_CONFIGS:
+        raise ValueError(f"Unknown MiDaS model type: {model_type}")
+    if export_format not in ("torchscript", "onnx"):
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    config = dict(MODEL_CONFIGS[model_type])
+    if input_size is not None:
+        config['input_size'] = round_to_stride(input_size)
+    if precision == "int8" and export_format == "onnx":
+        raise ValueError("int8 export is only supported for TorchScript")
+
+    model = torch.hub.load("intel-isl/MiDaS", model_type).cpu().eval()
+    if precision == "int8":
+        model = quantize_model(model)
+    example = torch.zeros(1, 3, config['input_size'], config['input_size'])
+    os.makedirs(output_dir, exist_ok=True)
+
+    if export_format == "onnx":
+        file_name = "model.onnx"
+        torch.onnx.export(
+            model, example, os.path.join(output_dir, file_name),
+            input_names=["image"], output_names=["depth"], opset_version=17,
+            dynamic_axes={"image": {0: "batch"}, "depth": {0: "batch"}}
+        )
+    else:
+        file_name = "model.pt"
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        traced = torch.jit.freeze(traced)
+        traced.save(os.path.join(output_dir, file_name))
+
+    metadata = dict(config, model_type=model_type, format=export_format, file=file_name, precision=precision)
+    with open(os.path.join(output_dir, MODEL_METADATA), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    return output_dir
+
+
+class AsyncDepthEstimator:
+    def __init__(self, estimator: DepthEstimator, motion_compensation: bool = False):
+        self.estimator = estimator
+        self.motion_compensation = motion_compensation
+        self.completed = 0
+        self.submitted = 0
+        self._pending = None
+        self._result = None
+        self._error = None
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        image: Union[np.ndarray, ScaledFrame],
+        anchor: Optional[Tuple[float, float]] = None,
+        timestamp: Optional[float] = None
+    ):
+        image = image.image if isinstance(image, ScaledFrame) else image
+        job = (image.copy(), anchor, time.perf_counter() if timestamp is None else timestamp)
+        with self._cond:
+            self._pending = job
+            self.submitted += 1
+            self._cond.notify()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                image, anchor, timestamp = self._pending
+                self._pending = None
+
+            try:
+                depth_map = self.estimator.predict(image)
+            except Exception as e:
+                self._error = e
+                return
+
+            with self._cond:
+                self._result = (depth_map, anchor, timestamp)
+                self.completed += 1
+
+    def latest(
+        self,
+        anchor: Optional[Tuple[float, float]] = None,
+        now: Optional[float] = None
+    ) -> Tuple[Optional[DepthPrediction], float]:
+        if self._error is not None:
+            raise self._error
+        with self._cond:
+            result = self._result
+        if result is None:
+            return None, float('inf')
+
+        depth_map, depth_anchor, timestamp = result
+        age = (time.perf_counter() if now is None else now) - timestamp
+
+        if self.motion_compensation and anchor is not None and depth_anchor is not None:
+            depth_map = depth_map.shifted(anchor[0] - depth_anchor[0], anchor[1] - depth_anchor[1])
+
+        return depth_map, age
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MiDaS model export and precision tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export a model for offline loading")
+    export_parser.add_argument("output_dir", type=str, help="Directory to write the exported model to")
+    export_parser.add_argument("--model", type=str, default="DPT_Large", choices=sorted(MODEL_CONFIGS),
+                               help="MiDaS model type")
+    export_parser.add_argument("--format", type=str, default="torchscript", choices=["torchscript", "onnx"],
+                               help="Export format")
+    export_parser.add_argument("--precision", type=str, default="fp32", choices=["fp32", "int8"],
+                               help="Weight precision of the exported model")
+    export_parser.add_argument("--input-size", type=int, default=None,
+                               help="Network input size (multiple of 32) to export at")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare reduced precision against fp32")
+    compare_parser.add_argument("source", type=str, help="Video file, image directory or session")
+    compare_parser.add_argument("--frames", type=int, default=20, help="Number of frames to compare")
+    compare_parser.add_argument("--model", type=str, default="DPT_Large", choices=sorted(MODEL_CONFIGS),
+                                help="MiDaS model type")
+    compare_parser.add_argument("--model-dir", type=str, default=None, help="Exported fp32 model directory")
+
+    video_parser = subparsers.add_parser("video", help="Estimate depth for every frame of a recording")
+    video_parser.add_argument("source", type=str, help="Video file, image directory or session")
+    video_parser.add_argument("output", type=str, help="Output .npy file (memory-mapped)")
+    video_parser.add_argument("--model", type=str, default="DPT_Large", choices=sorted(MODEL_CONFIGS),
+                              help="MiDaS model type")
+    video_parser.add_argument("--model-dir", type=str, default=None, help="Exported model directory")
+    video_parser.add_argument("--batch-size", type=int, default=8, help="Frames per inference batch")
+    video_parser.add_argument("--workers", type=int, default=4, help="Preprocessing threads")
+    video_parser.add_argument("--full-resolution", action="store_true",
+                              help="Store uint8 maps at frame resolution instead of native predictions")
+
+    args = parser.parse_args()
+
+    if args.command == "video":
+        estimator = DepthEstimator(args.model, model_dir=args.model_dir)
+        output = estimate_video_depth(
+            args.source, args.output, estimator,
+            args.batch_size, args.workers, args.full_resolution
+        )
+        print(f"Wrote {len(output)} depth maps to {args.output}")
+        return
+
+    if args.command == "export":
+        export_model(args.model, args.output_dir, args.format, args.precision, args.input_size)
+        print(f"Exported {args.model} ({args.precision}) to {args.output_dir}")
+        return
+
+    source = open_source(args.source)
+    frames = []
+    while len(frames) < args.frames:
+        color_frame, _ = source.get_frame()
+        if color_frame is None:
+            break
+        frames.append(color_frame)
+    source.release()
+
+    precisions = ("bf16",) if args.model_dir else ("bf16", "int8")
+    report = compare_precisions(frames, precisions, args.model, args.model_dir)
+    print(f"{'precision':<10} {'ms/frame':>10} {'mae':>8} {'rmse':>8} {'max':>8}")
+    for precision, metrics in report.items():
+        print(
+            f"{precision:<10} {metrics['ms_per_frame']:>10.1f} {metrics['mae']:>8.4f} "
+            f"{metrics['rmse']:>8.4f} {metrics['max_error']:>8.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
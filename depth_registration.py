@@ -0,0 +1,141 @@
+import json
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+
+class DepthRegistration:
+    def __init__(
+        self,
+        depth_intrinsics: Dict,
+        color_intrinsics: Dict,
+        rotation: Optional[np.ndarray] = None,
+        translation: Optional[np.ndarray] = None,
+        depth_units: float = 0.001,
+        min_depth: float = 0.3,
+        max_depth: float = 2.0
+    ):
+        self.depth_intrinsics = depth_intrinsics
+        self.color_intrinsics = color_intrinsics
+        self.rotation = np.eye(3, dtype=np.float32)
+        if rotation is not None:
+            self.rotation = np.asarray(rotation, dtype=np.float32).reshape(3, 3)
+        self.translation = np.zeros(3, dtype=np.float32)
+        if translation is not None:
+            self.translation = np.asarray(translation, dtype=np.float32).reshape(3)
+        self.depth_units = depth_units
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+
+        self.depth_size = (depth_intrinsics['width'], depth_intrinsics['height'])
+        self.color_size = (color_intrinsics['width'], color_intrinsics['height'])
+        self._rays = self._rotated_depth_rays()
+
+        inverse_depths = (1.0 / min_depth, 1.0 / max_depth)
+        self._reference_depth = 2.0 / sum(inverse_depths)
+        parallax = depth_intrinsics['fx'] * float(np.linalg.norm(self.translation))
+        self._margin = int(np.ceil(parallax * abs(inverse_depths[0] - inverse_depths[1]) / 2)) + 1
+        self._scale = depth_intrinsics['fx'] / color_intrinsics['fx']
+
+    @classmethod
+    def from_calibration(cls, calibration: Dict, **kwargs) -> "DepthRegistration":
+        return cls(
+            calibration['depth'],
+            calibration['color'],
+            rotation=calibration.get('rotation'),
+            translation=calibration.get('translation'),
+            depth_units=calibration.get('depth_units', 0.001),
+            **kwargs
+        )
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "DepthRegistration":
+        with open(path) as f:
+            return cls.from_calibration(json.load(f), **kwargs)
+
+    def to_calibration(self) -> Dict:
+        return {
+            'depth': self.depth_intrinsics,
+            'color': self.color_intrinsics,
+            'rotation': self.rotation.tolist(),
+            'translation': self.translation.tolist(),
+            'depth_units': self.depth_units
+        }
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_calibration(), f, indent=2)
+
+    def _rotated_depth_rays(self) -> np.ndarray:
+        intr = self.depth_intrinsics
+        w, h = self.depth_size
+        u = (np.arange(w, dtype=np.float32) - intr['cx']) / intr['fx']
+        v = (np.arange(h, dtype=np.float32) - intr['cy']) / intr['fy']
+
+        rays = np.empty((h, w, 3), dtype=np.float32)
+        rays[:, :, 0] = u
+        rays[:, :, 1] = v[:, None]
+        rays[:, :, 2] = 1.0
+        return rays.reshape(-1, 3) @ self.rotation.T
+
+    def _project(self, indices: np.ndarray, raw_depth: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        intr = self.color_intrinsics
+        w, h = self.color_size
+
+        z = raw_depth.astype(np.float32) * self.depth_units
+        points = self._rays[indices] * z[:, None]
+        points += self.translation
+
+        depth = points[:, 2]
+        u = np.floor(points[:, 0] / depth * intr['fx'] + intr['cx'] + 0.5).astype(np.intp)
+        v = np.floor(points[:, 1] / depth * intr['fy'] + intr['cy'] + 0.5).astype(np.intp)
+        valid = (depth > 0) & (u >= 0) & (u < w) & (v >= 0) & (v < h)
+
+        return (v * w + u)[valid], depth[valid]
+
+    def _scatter(self, targets: np.ndarray, depth: np.ndarray) -> np.ndarray:
+        w, h = self.color_size
+        aligned = np.zeros(h * w, dtype=np.uint16)
+        if len(targets):
+            order = np.lexsort((depth, targets))
+            targets = targets[order]
+            nearest = np.ones(len(targets), dtype=bool)
+            nearest[1:] = targets[1:] != targets[:-1]
+            raw = np.round(depth[order][nearest] / self.depth_units)
+            aligned[targets[nearest]] = np.clip(raw, 1, np.iinfo(np.uint16).max)
+        return aligned.reshape(h, w)
+
+    def align(self, depth_frame: np.ndarray) -> np.ndarray:
+        raw = depth_frame.reshape(-1)
+        indices = np.flatnonzero(raw)
+        return self._scatter(*self._project(indices, raw[indices]))
+
+    def depth_pixels(self, pixels: np.ndarray) -> np.ndarray:
+        color = self.color_intrinsics
+        depth = self.depth_intrinsics
+        pixels = np.asarray(pixels, dtype=np.float32).reshape(-1, 2)
+
+        points = np.empty((len(pixels), 3), dtype=np.float32)
+        points[:, 0] = (pixels[:, 0] - color['cx']) / color['fx']
+        points[:, 1] = (pixels[:, 1] - color['cy']) / color['fy']
+        points[:, 2] = 1.0
+        points *= self._reference_depth
+        points = (points - self.translation) @ self.rotation
+
+        result = np.empty((len(pixels), 2), dtype=np.float32)
+        result[:, 0] = points[:, 0] / points[:, 2] * depth['fx'] + depth['cx']
+        result[:, 1] = points[:, 1] / points[:, 2] * depth['fy'] + depth['cy']
+        return result
+
+    def align_around(self, depth_frame: np.ndarray, pixels: np.ndarray, radius: int = 1) -> np.ndarray:
+        w, h = self.depth_size
+        centers = np.floor(self.depth_pixels(pixels)).astype(np.intp)
+        half = int(np.ceil(radius * self._scale)) + self._margin
+
+        offsets = np.arange(-half, half + 1)
+        xs = np.clip(centers[:, 0, None] + offsets, 0, w - 1)
+        ys = np.clip(centers[:, 1, None] + offsets, 0, h - 1)
+        raw = depth_frame.reshape(-1)
+        selected = np.zeros(len(raw), dtype=bool)
+        selected[(ys[:, :, None] * w + xs[:, None, :]).reshape(-1)] = True
+        indices = np.flatnonzero(selected & (raw > 0))
+        return self._scatter(*self._project(indices, raw[indices]))
@@ -0,0 +1,240 @@
+import argparse
+import math
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Union
+
+from landmarks import as_landmark_array
+
+
+PALM_TRIANGLE = [0, 5, 17]
+
+
+class DynamicGestureRecognizer:
+    def __init__(
+        self,
+        window: int = 60,
+        swipe_window: int = 30,
+        min_frames: int = 6,
+        swipe_distance: float = 0.25,
+        swipe_straightness: float = 0.5,
+        circle_angle: float = 1.8 * math.pi,
+        circle_min_path: float = 0.3,
+        circle_consistency: float = 0.8,
+        circle_closure: float = 0.5,
+        circle_roundness: float = 0.5,
+        max_turn: float = 0.75 * math.pi,
+        push_fraction: float = 0.2,
+        min_step: float = 0.015,
+        velocity_smoothing: float = 0.5,
+        cooldown: int = 10
+    ):
+        self.window = window
+        self.swipe_window = min(swipe_window, window)
+        self.min_frames = min_frames
+        self.swipe_distance = swipe_distance
+        self.swipe_straightness = swipe_straightness
+        self.circle_angle = circle_angle
+        self.circle_min_path = circle_min_path
+        self.circle_consistency = circle_consistency
+        self.circle_closure = circle_closure
+        self.circle_roundness = circle_roundness
+        self.max_turn = max_turn
+        self.push_fraction = push_fraction
+        self.min_step = min_step
+        self.velocity_smoothing = velocity_smoothing
+        self.cooldown = cooldown
+
+        self._positions = np.zeros((window, 2), dtype=np.float64)
+        self._depths = np.zeros(window, dtype=np.float64)
+        self._turns = np.zeros(window, dtype=np.float64)
+        self._steps = np.zeros(window, dtype=np.float64)
+        self._areas = np.zeros(window, dtype=np.float64)
+        self.events = 0
+        self.reset()
+
+    def reset(self):
+        self._head = 0
+        self._count = 0
+        self._turn_sum = 0.0
+        self._abs_turn_sum = 0.0
+        self._path_sum = 0.0
+        self._area_sum = 0.0
+        self._direction: Optional[Tuple[float, float]] = None
+        self._anchor: Optional[Tuple[float, float]] = None
+        self._timestamp: Optional[float] = None
+        self._cooldown_left = 0
+        self.velocity = (0.0, 0.0)
+
+    def update(
+        self,
+        palm_center: Tuple[float, float],
+        distance: float = 0.0,
+        timestamp: Optional[float] = None
+    ) -> Optional[str]:
+        x, y = float(palm_center[0]), float(palm_center[1])
+        newest = (self._head + self._count - 1) % self.window
+
+        step = turn = area = 0.0
+        if self._count:
+            area = self._positions[newest, 0] * y - self._positions[newest, 1] * x
+            dx = x - self._positions[newest, 0]
+            dy = y - self._positions[newest, 1]
+            dt = 1.0
+            if timestamp is not None and self._timestamp is not None:
+                dt = max(timestamp - self._timestamp, 1e-6)
+            a = self.velocity_smoothing
+            self.velocity = (
+                a * dx / dt + (1 - a) * self.velocity[0],
+                a * dy / dt + (1 - a) * self.velocity[1]
+            )
+        self._timestamp = timestamp
+
+        if self._anchor is None:
+            self._anchor = (x, y)
+        else:
+            dx, dy = x - self._anchor[0], y - self._anchor[1]
+            chord = math.hypot(dx, dy)
+            if chord >= self.min_step:
+                if self._direction is not None:
+                    px, py = self._direction
+                    turn = math.atan2(px * dy - py * dx, px * dx + py * dy)
+                    if abs(turn) > self.max_turn:
+                        turn = 0.0
+                self._direction = (dx, dy)
+                self._anchor = (x, y)
+                step = chord
+
+        if self._count == self.window:
+            self._turn_sum -= self._turns[self._head]
+            self._abs_turn_sum -= abs(self._turns[self._head])
+            self._path_sum -= self._steps[self._head]
+            self._area_sum -= self._areas[self._head]
+            self._head = (self._head + 1) % self.window
+            self._count -= 1
+
+        slot = (self._head + self._count) % self.window
+        self._positions[slot] = (x, y)
+        self._depths[slot] = distance
+        self._turns[slot] = turn
+        self._steps[slot] = step
+        self._areas[slot] = area
+        self._turn_sum += turn
+        self._abs_turn_sum += abs(turn)
+        self._path_sum += step
+        self._area_sum += area
+        self._count += 1
+
+        if self._cooldown_left:
+            self._cooldown_left -= 1
+            return None
+
+        gesture = self._detect()
+        if gesture is not None:
+            self.events += 1
+            self._head = self._count = 0
+            self._turn_sum = self._abs_turn_sum = self._path_sum = self._area_sum = 0.0
+            self._direction = self._anchor = None
+            self._cooldown_left = self.cooldown
+        return gesture
+
+    def _detect(self) -> Optional[str]:
+        if self._count < self.min_frames:
+            return None
+
+        newest = (self._head + self._count - 1) % self.window
+        turning = abs(self._turn_sum)
+        if (turning >= self.circle_angle and
+                turning >= self.circle_consistency * self._abs_turn_sum and
+                self._path_sum >= self.circle_min_path):
+            (x0, y0), (x1, y1) = self._positions[self._head], self._positions[newest]
+            closure = math.hypot(x1 - x0, y1 - y0)
+            area = abs(self._area_sum - self._areas[self._head] + x1 * y0 - y1 * x0) / 2
+            if (closure <= self.circle_closure * self._path_sum and
+                    4 * math.pi * area >= self.circle_roundness * self._path_sum ** 2):
+                return "circle"
+
+        oldest = (self._head + max(self._count - self.swipe_window, 0)) % self.window
+        dx, dy = self._positions[newest] - self._positions[oldest]
+        displacement = math.hypot(dx, dy)
+
+        start_distance = self._depths[oldest]
+        if (start_distance > 0 and
+                start_distance - self._depths[newest] >= self.push_fraction * start_distance and
+                displacement < self.swipe_distance / 2):
+            return "push"
+
+        if abs(dx) >= self.swipe_distance and abs(dy) <= self.swipe_straightness * abs(dx):
+            return "swipe_right" if dx > 0 else "swipe_left"
+
+        return None
+
+
+def hand_distance(
+    landmarks: Union[np.ndarray, List[Dict]],
+    image_size: Tuple[int, int] = (1, 1)
+) -> float:
+    landmarks = as_landmark_array(landmarks)
+    if landmarks is None or len(landmarks) < 21:
+        return 0.0
+
+    palm = landmarks[PALM_TRIANGLE, :2] * np.asarray(image_size, dtype=np.float32)
+    perimeter = float(np.linalg.norm(palm - np.roll(palm, 1, axis=0), axis=1).sum())
+    return 1.0 / perimeter if perimeter > 0 else 0.0
+
+
+def motion_traces(seed: int = 0) -> List[Tuple[str, np.ndarray, List[str]]]:
+    rng = np.random.default_rng(seed)
+    traces = []
+
+    for frames in (12, 28, 40, 55):
+        for sign in (1, -1):
+            t = np.linspace(0, 2.1 * math.pi, frames) * sign
+            path = np.stack([0.5 + 0.1 * np.cos(t), 0.5 + 0.1 * np.sin(t)], axis=1)
+            traces.append((f"circle_{frames}", path, ["circle"]))
+
+    for frames in (8, 15, 25):
+        x = np.linspace(0.2, 0.7, frames)
+        path = np.stack([x, np.full(frames, 0.5)], axis=1)
+        traces.append((f"swipe_right_{frames}", path, ["swipe_right"]))
+        traces.append((f"swipe_left_{frames}", path[::-1], ["swipe_left"]))
+
+    for period in (8, 12, 20):
+        phase = np.arange(120) * 2 * math.pi / period
+        x = 0.08 * np.sin(phase)
+        path = np.stack([0.5 + x, 0.4 + 2.0 * x * x], axis=1)
+        traces.append((f"wave_{period}", path, []))
+
+    for spread in (0.002, 0.004, 0.008):
+        path = 0.5 + rng.normal(0, spread, (120, 2))
+        traces.append((f"jitter_{spread}", path, []))
+
+    return [(name, path + rng.normal(0, 0.001, path.shape), expected) for name, path, expected in traces]
+
+
+def check_motion(seeds: int = 10) -> List[Tuple[str, List[str], List[str]]]:
+    failures = []
+    for seed in range(seeds):
+        for name, path, expected in motion_traces(seed):
+            recognizer = DynamicGestureRecognizer()
+            events = [recognizer.update(point, 0.0, i / 30) for i, point in enumerate(path)]
+            events = [event for event in events if event is not None]
+            if events != expected:
+                failures.append((f"{name}/{seed}", expected, events))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic motion traces through the dynamic recognizer")
+    parser.add_argument("--seeds", type=int, default=10, help="Noise seeds per trace")
+    args = parser.parse_args()
+
+    failures = check_motion(args.seeds)
+    for name, expected, events in failures:
+        print(f"{name:<20} expected {expected} got {events}")
+    print(f"Motion: {len(failures)} mismatches over {args.seeds * len(motion_traces())} traces")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
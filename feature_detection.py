@@ -1,45 +1,208 @@
 import cv2
+import math
+import time
 import numpy as np
-from typing import Optional, List, Dict, Tuple
-import mediapipe as mp
-from ultralytics import YOLO
+from typing import Optional, List, Dict, Tuple, Union
+
+from frame_scaling import ScaledFrame, InferenceResolution, round_to_stride
+from landmark_filter import OneEuroLandmarkFilter
+from landmarks import LandmarkSet, NUM_HAND_LANDMARKS, NUM_FACE_LANDMARKS
+from startup_profile import lazy_import
+
+mp = lazy_import("mediapipe")
+ultralytics = lazy_import("ultralytics")
+
+
+DETECTION_DTYPE = np.dtype([
+    ('bbox', np.float32, (4,)),
+    ('confidence', np.float32),
+    ('class_id', np.int32)
+])
 
 
 class HandDetector:
-    def __init__(self):
+    def __init__(
+        self,
+        tracking: bool = False,
+        roi_padding: float = 0.3,
+        redetect_interval: int = 30,
+        min_roi_score: float = 0.8,
+        max_roi_fraction: float = 0.6,
+        inference_size: Optional[Tuple[int, int]] = None,
+        inference_scale: Optional[float] = None,
+        static_image_mode: bool = False
+    ):
+        self.resolution = InferenceResolution(inference_size, inference_scale)
+        self.static_image_mode = static_image_mode
         self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
+        self.hands = self._create_hands()
+
+        self.tracking = tracking
+        self.roi_padding = roi_padding
+        self.redetect_interval = redetect_interval
+        self.min_roi_score = min_roi_score
+        self.max_roi_fraction = max_roi_fraction
+        self.roi_hands = self._create_hands(static_image_mode=True) if tracking else None
+        self.full_detections = 0
+        self.roi_detections = 0
+        self._prev_landmarks: Optional[LandmarkSet] = None
+        self._frames_since_full = 0
+
+    def _create_hands(self, static_image_mode: Optional[bool] = None):
+        if static_image_mode is None:
+            static_image_mode = self.static_image_mode
+        return self.mp_hands.Hands(
+            static_image_mode=static_image_mode,
             max_num_hands=2,
             min_detection_confidence=0.7,
             min_tracking_confidence=0.5
         )
-        self.mp_draw = mp.solutions.drawing_utils
-
-    def detect(self, image: np.ndarray) -> Tuple[np.ndarray, List[Dict]]:
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(image_rgb)
-
-        landmarks_list = []
-        if results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                landmarks = []
-                for landmark in hand_landmarks.landmark:
-                    landmarks.append({
-                        'x': landmark.x,
-                        'y': landmark.y,
-                        'z': landmark.z
-                    })
-                landmarks_list.append(landmarks)
-                self.mp_draw.draw_landmarks(
-                    image, hand_landmarks, self.mp_hands.HAND_CONNECTIONS
-                )
-
-        return image, landmarks_list
+
+    def detect(self, image: Union[np.ndarray, ScaledFrame]) -> Tuple[np.ndarray, LandmarkSet]:
+        image, inference_image = self.resolution.prepare(image)
+        landmarks = None
+        roi = self._next_roi(inference_image.shape[1], inference_image.shape[0]) if self.tracking else None
+
+        if roi is not None:
+            landmarks = self._detect_roi(image, inference_image, roi)
+
+        if landmarks is None:
+            landmarks = self._detect_region(self.hands, inference_image)
+            self.full_detections += 1
+            self._frames_since_full = 0
+        else:
+            self.roi_detections += 1
+            self._frames_since_full += 1
+
+        if self.tracking:
+            self._prev_landmarks = landmarks if len(landmarks) else None
+
+        return image, landmarks
+
+    def _detect_region(self, hands, region: np.ndarray) -> LandmarkSet:
+        region_rgb = cv2.cvtColor(region, cv2.COLOR_BGR2RGB)
+        results = hands.process(region_rgb)
+
+        return LandmarkSet.from_mediapipe(
+            results.multi_hand_landmarks,
+            results.multi_handedness,
+            NUM_HAND_LANDMARKS
+        )
+
+    def _detect_roi(
+        self,
+        image: np.ndarray,
+        inference_image: np.ndarray,
+        roi: Tuple[int, int, int, int]
+    ) -> Optional[LandmarkSet]:
+        x0, y0, x1, y1 = roi
+        landmarks = self._detect_region(self.roi_hands, inference_image[y0:y1, x0:x1])
+
+        if len(landmarks) < len(self._prev_landmarks) or landmarks.scores.min() < self.min_roi_score:
+            return None
+
+        h, w = inference_image.shape[:2]
+
+        crop_w, crop_h = x1 - x0, y1 - y0
+        points = landmarks.points
+        points[..., 0] = (points[..., 0] * crop_w + x0) / w
+        points[..., 1] = (points[..., 1] * crop_h + y0) / h
+        points[..., 2] *= crop_w / w
+
+        return landmarks
+
+    def _next_roi(self, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+        if self._prev_landmarks is None or self._frames_since_full >= self.redetect_interval:
+            return None
+
+        pixels = self._prev_landmarks.xy.reshape(-1, 2) * (width, height)
+        (x_min, y_min), (x_max, y_max) = pixels.min(axis=0), pixels.max(axis=0)
+        cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+        half = max(x_max - x_min, y_max - y_min) * (0.5 + self.roi_padding)
+
+        x0 = max(int(cx - half), 0)
+        y0 = max(int(cy - half), 0)
+        x1 = min(int(cx + half) + 1, width)
+        y1 = min(int(cy + half) + 1, height)
+
+        if x1 <= x0 or y1 <= y0:
+            return None
+        if (x1 - x0) * (y1 - y0) > self.max_roi_fraction * width * height:
+            return None
+        return x0, y0, x1, y1
+
+    def reset_tracking(self):
+        self._prev_landmarks = None
+        self._frames_since_full = 0
+
+
+class ScheduledDetector:
+    def __init__(
+        self,
+        detector,
+        detect_every: int = 1,
+        time_budget: Optional[float] = None,
+        max_interval: int = 8,
+        landmark_filter: Optional[OneEuroLandmarkFilter] = None
+    ):
+        self.detector = detector
+        self.detect_every = detect_every
+        self.time_budget = time_budget
+        self.max_interval = max_interval
+        self.filter = landmark_filter or OneEuroLandmarkFilter()
+        self.detect_cost = 0.0
+        self.detections = 0
+        self.predictions = 0
+        self._last = LandmarkSet.empty()
+        self._frames_since_detect = 0
+
+    @property
+    def interval(self) -> int:
+        if self.time_budget is None:
+            return max(self.detect_every, 1)
+        return min(max(math.ceil(self.detect_cost / self.time_budget), 1), self.max_interval)
+
+    def detect(
+        self,
+        image: Union[np.ndarray, ScaledFrame],
+        timestamp: Optional[float] = None
+    ) -> Tuple[np.ndarray, LandmarkSet]:
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+
+        if self._frames_since_detect + 1 < self.interval and len(self._last):
+            self._frames_since_detect += 1
+            self.predictions += 1
+            points = self.filter.predict(timestamp)
+            display = image.image if isinstance(image, ScaledFrame) else image
+            return display, LandmarkSet(points, self._last.handedness, self._last.scores)
+
+        start = time.perf_counter()
+        display, landmarks = self.detector.detect(image)
+        cost = time.perf_counter() - start
+        self.detect_cost = cost if self.detections == 0 else 0.8 * self.detect_cost + 0.2 * cost
+        self.detections += 1
+        self._frames_since_detect = 0
+
+        if len(landmarks):
+            landmarks = LandmarkSet(
+                self.filter.update(landmarks.points, timestamp),
+                landmarks.handedness,
+                landmarks.scores
+            )
+        else:
+            self.filter.reset()
+        self._last = landmarks
+
+        return display, landmarks
 
 
 class FaceDetector:
-    def __init__(self):
+    def __init__(
+        self,
+        inference_size: Optional[Tuple[int, int]] = None,
+        inference_scale: Optional[float] = None
+    ):
+        self.resolution = InferenceResolution(inference_size, inference_scale)
         self.mp_face = mp.solutions.face_mesh
         self.face_mesh = self.mp_face.FaceMesh(
             static_image_mode=False,
@@ -47,66 +210,84 @@ class FaceDetector:
             min_detection_confidence=0.7,
             min_tracking_confidence=0.5
         )
-        self.mp_draw = mp.solutions.drawing_utils
 
-    def detect(self, image: np.ndarray) -> Tuple[np.ndarray, List[Dict]]:
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    def detect(self, image: Union[np.ndarray, ScaledFrame]) -> Tuple[np.ndarray, LandmarkSet]:
+        image, inference_image = self.resolution.prepare(image)
+        image_rgb = cv2.cvtColor(inference_image, cv2.COLOR_BGR2RGB)
         results = self.face_mesh.process(image_rgb)
 
-        landmarks_list = []
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                landmarks = []
-                for landmark in face_landmarks.landmark:
-                    landmarks.append({
-                        'x': landmark.x,
-                        'y': landmark.y,
-                        'z': landmark.z
-                    })
-                landmarks_list.append(landmarks)
-                self.mp_draw.draw_landmarks(
-                    image, face_landmarks, self.mp_face.FACEMESH_CONTOURS
-                )
+        landmarks = LandmarkSet.from_mediapipe(
+            results.multi_face_landmarks,
+            num_landmarks=NUM_FACE_LANDMARKS
+        )
 
-        return image, landmarks_list
+        return image, landmarks
 
 
 class ObjectDetector:
-    def __init__(self, model_name: str = "yolov8n.pt"):
-        self.model = YOLO(model_name)
+    def __init__(
+        self,
+        model_name: str = "yolov8n.pt",
+        inference_size: Optional[Tuple[int, int]] = None,
+        inference_scale: Optional[float] = None
+    ):
+        self.resolution = InferenceResolution(inference_size, inference_scale)
+        self.model = ultralytics.YOLO(model_name)
+
+    def detect(self, image: Union[np.ndarray, ScaledFrame], conf: float = 0.5) -> Tuple[np.ndarray, List[Dict]]:
+        image, boxes = self.detect_boxes(image, conf)
+        return image, self.to_dicts(boxes)
+
+    def detect_boxes(self, image: Union[np.ndarray, ScaledFrame], conf: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+        image, inference_image = self.resolution.prepare(image)
+        results = self.model(inference_image, conf=conf, verbose=False, **self._model_kwargs(inference_image))
+        return image, self._boxes_to_array(results[0], image, inference_image)
+
+    def detect_batch(
+        self,
+        frames: List[Union[np.ndarray, ScaledFrame]],
+        conf: float = 0.5
+    ) -> List[np.ndarray]:
+        if not frames:
+            return []
+        prepared = [self.resolution.prepare(frame) for frame in frames]
+        results = self.model(
+            [inference for _, inference in prepared], conf=conf, verbose=False,
+            **self._model_kwargs(prepared[0][1])
+        )
+        return [
+            self._boxes_to_array(result, image, inference)
+            for result, (image, inference) in zip(results, prepared)
+        ]
+
+    def _model_kwargs(self, inference_image: np.ndarray) -> Dict:
+        if not self.resolution.enabled:
+            return {}
+        return {'imgsz': round_to_stride(max(inference_image.shape[:2]))}
+
+    def _boxes_to_array(self, result, image: np.ndarray, inference_image: np.ndarray) -> np.ndarray:
+        data = result.boxes.data.cpu().numpy()
+        boxes = np.empty(len(data), dtype=DETECTION_DTYPE)
+        if not len(data):
+            return boxes
 
-    def detect(self, image: np.ndarray, conf: float = 0.5) -> Tuple[np.ndarray, List[Dict]]:
-        results = self.model(image, conf=conf, verbose=False)
+        sx = image.shape[1] / inference_image.shape[1]
+        sy = image.shape[0] / inference_image.shape[0]
+        boxes['bbox'] = data[:, :4] * (sx, sy, sx, sy)
+        boxes['confidence'] = data[:, -2]
+        boxes['class_id'] = data[:, -1]
+        return boxes
 
+    def to_dicts(self, boxes: np.ndarray) -> List[Dict]:
         detections = []
-        annotated_frame = image.copy()
-
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                conf_score = float(box.conf[0])
-                class_id = int(box.cls[0])
-                class_name = self.model.names[class_id]
-
-                detections.append({
-                    'bbox': [float(x1), float(y1), float(x2), float(y2)],
-                    'confidence': conf_score,
-                    'class_id': class_id,
-                    'class_name': class_name,
-                    'center': [(x1 + x2) / 2, (y1 + y2) / 2]
-                })
-
-                cv2.rectangle(
-                    annotated_frame,
-                    (int(x1), int(y1)),
-                    (int(x2), int(y2)),
-                    (0, 255, 0), 2
-                )
-                label = f"{class_name}: {conf_score:.2f}"
-                cv2.putText(
-                    annotated_frame, label, (int(x1), int(y1) - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2
-                )
-
-        return annotated_frame, detections
+        for (x1, y1, x2, y2), conf_score, class_id in zip(
+            boxes['bbox'].tolist(), boxes['confidence'].tolist(), boxes['class_id'].tolist()
+        ):
+            detections.append({
+                'bbox': [x1, y1, x2, y2],
+                'confidence': conf_score,
+                'class_id': class_id,
+                'class_name': self.model.names[class_id],
+                'center': [(x1 + x2) / 2, (y1 + y2) / 2]
+            })
+        return detections
@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+from typing import Optional, Tuple, Dict, Union
+
+
+class ScaledFrame:
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self._cache: Dict[Tuple[int, int], np.ndarray] = {}
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.image.shape
+
+    def resized(self, size: Optional[Tuple[int, int]]) -> np.ndarray:
+        h, w = self.image.shape[:2]
+        if size is None or size == (w, h):
+            return self.image
+        if size not in self._cache:
+            self._cache[size] = cv2.resize(self.image, size, interpolation=cv2.INTER_AREA)
+        return self._cache[size]
+
+
+class InferenceResolution:
+    def __init__(
+        self,
+        size: Optional[Tuple[int, int]] = None,
+        scale: Optional[float] = None
+    ):
+        if size is not None and scale is not None:
+            raise ValueError("Specify either an inference size or a scale, not both")
+        self.size = tuple(size) if size is not None else None
+        self.scale = scale
+
+    def target_size(self, width: int, height: int) -> Optional[Tuple[int, int]]:
+        if self.size is not None:
+            return self.size
+        if self.scale is not None and self.scale != 1.0:
+            return max(int(round(width * self.scale)), 1), max(int(round(height * self.scale)), 1)
+        return None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size is not None or (self.scale is not None and self.scale != 1.0)
+
+    def prepare(self, image: Union[np.ndarray, ScaledFrame]) -> Tuple[np.ndarray, np.ndarray]:
+        frame = as_scaled_frame(image)
+        h, w = frame.shape[:2]
+        return frame.image, frame.resized(self.target_size(w, h))
+
+
+def round_to_stride(value: float, stride: int = 32) -> int:
+    return max(int(round(value / stride)) * stride, stride)
+
+
+def as_scaled_frame(image: Union[np.ndarray, ScaledFrame]) -> ScaledFrame:
+    if isinstance(image, ScaledFrame):
+        return image
+    return ScaledFrame(image)
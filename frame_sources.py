@@ -0,0 +1,216 @@
+import cv2
+import json
+import os
+import sys
+import time
+import numpy as np
+from typing import Optional, Tuple, List
+
+from session_recorder import SessionReader, is_recorded_session
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class FrameSource:
+    def __init__(self, realtime: bool = False, loop: bool = False):
+        self.realtime = realtime
+        self.loop = loop
+        self.index = 0
+        self._start_time = None
+        self._start_timestamp = 0.0
+
+    def __len__(self) -> int:
+        return 0
+
+    def get_frame(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        if self.index >= len(self):
+            if not self.loop or len(self) == 0:
+                return None, None
+            self.seek(0)
+
+        color_image, depth_image = self._read(self.index)
+        if color_image is None and self.loop and self.index > 0:
+            self.seek(0)
+            color_image, depth_image = self._read(self.index)
+        if color_image is None:
+            return None, None
+
+        if self.realtime:
+            self._pace(self._timestamp(self.index))
+        self.index += 1
+
+        return color_image, depth_image
+
+    def seek(self, index: int):
+        self.index = index
+        self._start_time = None
+
+    def _pace(self, timestamp: float):
+        if self._start_time is None:
+            self._start_time = time.perf_counter()
+            self._start_timestamp = timestamp
+            return
+        delay = (timestamp - self._start_timestamp) - (time.perf_counter() - self._start_time)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _read(self, index: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        raise NotImplementedError
+
+    def _timestamp(self, index: int) -> float:
+        raise NotImplementedError
+
+    def get_intrinsics(self) -> Optional[dict]:
+        return None
+
+    @property
+    def has_depth(self) -> bool:
+        return False
+
+    def release(self):
+        pass
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path: str, realtime: bool = False, loop: bool = False):
+        super().__init__(realtime, loop)
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open video file {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or sys.maxsize
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def seek(self, index: int):
+        super().seek(index)
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    def _read(self, index: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        ret, frame = self.cap.read()
+        if not ret:
+            return None, None
+        return frame, None
+
+    def _timestamp(self, index: int) -> float:
+        return index / self.fps
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    def __init__(
+        self,
+        path: str,
+        fps: float = 30.0,
+        realtime: bool = False,
+        loop: bool = False
+    ):
+        super().__init__(realtime, loop)
+        self.path = path
+        self.fps = fps
+        self.files = _list_images(path)
+        if not self.files:
+            raise RuntimeError(f"No images found in {path}")
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def _read(self, index: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        return cv2.imread(self.files[index], cv2.IMREAD_COLOR), None
+
+    def _timestamp(self, index: int) -> float:
+        return index / self.fps
+
+
+class DepthSessionSource(FrameSource):
+    def __init__(
+        self,
+        path: str,
+        fps: float = 30.0,
+        realtime: bool = False,
+        loop: bool = False
+    ):
+        super().__init__(realtime, loop)
+        self.path = path
+        self.color_files = _list_images(os.path.join(path, 'color'))
+        self.depth_files = _list_images(os.path.join(path, 'depth'))
+        if not self.color_files or len(self.color_files) != len(self.depth_files):
+            raise RuntimeError(f"Invalid depth session at {path}")
+
+        self.intrinsics = None
+        self.timestamps = [i / fps for i in range(len(self.color_files))]
+
+        meta_path = os.path.join(path, 'session.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.intrinsics = meta.get('intrinsics')
+            self.timestamps = meta.get('timestamps', self.timestamps)
+
+    def __len__(self) -> int:
+        return len(self.color_files)
+
+    def _read(self, index: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        color_image = cv2.imread(self.color_files[index], cv2.IMREAD_COLOR)
+        depth_image = cv2.imread(self.depth_files[index], cv2.IMREAD_UNCHANGED)
+        return color_image, depth_image
+
+    def _timestamp(self, index: int) -> float:
+        return self.timestamps[index]
+
+    def get_intrinsics(self) -> Optional[dict]:
+        return self.intrinsics
+
+    @property
+    def has_depth(self) -> bool:
+        return True
+
+
+class RecordedSessionSource(FrameSource):
+    def __init__(self, path: str, realtime: bool = False, loop: bool = False):
+        super().__init__(realtime, loop)
+        self.path = path
+        self.reader = SessionReader(path)
+
+    def __len__(self) -> int:
+        return len(self.reader)
+
+    def _read(self, index: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        return self.reader.read(index)
+
+    def _timestamp(self, index: int) -> float:
+        return self.reader.timestamp(index)
+
+    def get_intrinsics(self) -> Optional[dict]:
+        return self.reader.intrinsics
+
+    @property
+    def has_depth(self) -> bool:
+        return True
+
+    def release(self):
+        self.reader.close()
+
+
+def _list_images(path: str) -> List[str]:
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def open_source(path: str, realtime: bool = False, loop: bool = False) -> FrameSource:
+    if os.path.isdir(path):
+        if is_recorded_session(path):
+            return RecordedSessionSource(path, realtime=realtime, loop=loop)
+        if os.path.isdir(os.path.join(path, 'color')) and os.path.isdir(os.path.join(path, 'depth')):
+            return DepthSessionSource(path, realtime=realtime, loop=loop)
+        return ImageDirectorySource(path, realtime=realtime, loop=loop)
+    return VideoFileSource(path, realtime=realtime, loop=loop)
@@ -1,100 +1,183 @@
+import argparse
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
+
+from gesture_templates import GestureTemplateLibrary
+from landmarks import LandmarkSet, as_landmark_array
+
+
+PALM_POINTS = [0, 1, 5, 9, 13, 17]
+
+FINGER_NAMES = ('thumb', 'index', 'middle', 'ring', 'pinky')
+FINGER_TIPS = [8, 12, 16, 20]
+FINGER_PIPS = [6, 10, 14, 18]
+FINGER_MCPS = [5, 9, 13, 17]
+
+GESTURES = (
+    "unknown", "i_love_you", "peace", "open_hand", "four",
+    "fist", "thumbs_up", "one", "two"
+)
 
 
 class GestureRecognizer:
-    def __init__(self, confidence_threshold: float = 0.8):
+    def __init__(
+        self,
+        confidence_threshold: float = 0.8,
+        history_size: int = 8,
+        max_track_distance: float = 0.15,
+        max_missed_frames: int = 5,
+        templates: Optional[GestureTemplateLibrary] = None,
+        template_distance: float = 0.5
+    ):
         self.confidence_threshold = confidence_threshold
-        self.gesture_history = []
-        self.history_size = 8
+        self.history_size = history_size
+        self.max_track_distance = max_track_distance
+        self.max_missed_frames = max_missed_frames
+        self.templates = templates
+        self.template_distance = template_distance
         self.current_gesture = None
+        self.tracks: Dict[int, Dict] = {}
+        self._state = self._new_state()
+        self._next_track_id = 0
 
-    def recognize(self, landmarks: List[Dict]) -> Optional[str]:
-        if not landmarks or len(landmarks) < 21:
-            return None
+    @staticmethod
+    def _new_state(center: Optional[Tuple[float, float]] = None) -> Dict:
+        return {'candidate': None, 'run': 0, 'gesture': None, 'center': center, 'missed': 0}
 
-        if not all(lm is not None and 'x' in lm and 'y' in lm for lm in landmarks):
+    def recognize(
+        self,
+        landmarks: Union[np.ndarray, List[Dict]],
+        image_size: Tuple[int, int] = (1, 1)
+    ) -> Optional[str]:
+        landmarks = as_landmark_array(landmarks)
+        if landmarks is None or len(landmarks) < 21:
             return None
 
         fingers_extended = self._get_finger_states(landmarks)
         gesture = self._classify_gesture(fingers_extended, landmarks)
+        if self.templates is not None:
+            matched, _ = self.templates.match(landmarks, self.template_distance, image_size)
+            gesture = matched[0] or gesture
 
-        self.gesture_history.append(gesture)
-        if len(self.gesture_history) > self.history_size:
-            self.gesture_history.pop(0)
+        self.current_gesture = self._update_state(self._state, gesture)
+        return self.current_gesture
 
-        if self._is_stable_gesture(gesture):
-            self.current_gesture = gesture
-            return gesture
+    def recognize_hands(
+        self,
+        hands: Union[LandmarkSet, np.ndarray, List[Union[np.ndarray, List[Dict]]]],
+        image_size: Tuple[int, int] = (1, 1)
+    ) -> List[Dict]:
+        if isinstance(hands, LandmarkSet):
+            hands = hands.points
+        elif not isinstance(hands, np.ndarray):
+            hands = [as_landmark_array(hand) for hand in hands]
+            hands = np.array(
+                [hand[:21] for hand in hands if hand is not None and len(hand) >= 21], dtype=np.float32
+            )
+        hands = hands.reshape(-1, 21, 3)
 
-        return self.current_gesture
+        labels, masks = self.classify_hands(hands, image_size)
+        centers = hands[:, PALM_POINTS, :2].mean(axis=1)
+        track_ids = self._assign_tracks(centers)
 
-    def _get_finger_states(self, landmarks: List[Dict]) -> Dict[str, bool]:
-        wrist = landmarks[0]
-        index_mcp = landmarks[5]
-        pinky_mcp = landmarks[17]
-        hand_center_x = (index_mcp['x'] + pinky_mcp['x']) / 2
+        results = []
+        for track_id, label, mask, center in zip(track_ids, labels, masks, centers.tolist()):
+            state = self.tracks[track_id]
+            results.append({
+                'track_id': track_id,
+                'gesture': self._update_state(state, label),
+                'finger_mask': int(mask),
+                'palm_center': tuple(center)
+            })
+        return results
 
-        fingers = {}
+    def _assign_tracks(self, centers: np.ndarray) -> List[int]:
+        track_ids = list(self.tracks)
+        assigned = [None] * len(centers)
+
+        if track_ids and len(centers):
+            previous = np.array([self.tracks[t]['center'] for t in track_ids])
+            distances = np.linalg.norm(previous[:, None] - centers[None], axis=2)
+            for flat in np.argsort(distances, axis=None):
+                track, hand = divmod(int(flat), len(centers))
+                if distances[track, hand] > self.max_track_distance:
+                    break
+                if assigned[hand] is None and track_ids[track] is not None:
+                    assigned[hand] = track_ids[track]
+                    track_ids[track] = None
 
-        thumb_tip = landmarks[4]
-        thumb_ip = landmarks[3]
-        thumb_mcp = landmarks[1]
-        thumb_extended = self._check_thumb(thumb_tip, thumb_ip, thumb_mcp, wrist, hand_center_x)
-        fingers['thumb'] = thumb_extended
+        for track_id in track_ids:
+            if track_id is None:
+                continue
+            state = self.tracks[track_id]
+            state['missed'] += 1
+            if state['missed'] > self.max_missed_frames:
+                del self.tracks[track_id]
+
+        for hand, center in enumerate(centers.tolist()):
+            if assigned[hand] is None:
+                assigned[hand] = self._next_track_id
+                self.tracks[self._next_track_id] = self._new_state()
+                self._next_track_id += 1
+            state = self.tracks[assigned[hand]]
+            state['center'] = center
+            state['missed'] = 0
+
+        return assigned
+
+    def _update_state(self, state: Dict, gesture: Optional[str]) -> Optional[str]:
+        if gesture == state['candidate']:
+            state['run'] += 1
+        else:
+            state['candidate'] = gesture
+            state['run'] = 1
+
+        if gesture is not None and gesture != "unknown" and state['run'] >= self.history_size:
+            state['gesture'] = gesture
+        return state['gesture']
+
+    def reset_tracks(self):
+        self.tracks.clear()
+        self._state = self._new_state()
+        self.current_gesture = None
+
+    def _get_finger_states(self, landmarks: np.ndarray) -> Dict[str, bool]:
+        x = landmarks[:, 0].tolist()
+        y = landmarks[:, 1].tolist()
+        hand_center_x = (x[5] + x[17]) / 2
+
+        fingers = {}
+        fingers['thumb'] = self._check_thumb(x[4], x[1], x[0], hand_center_x)
 
         for finger_name, tip_idx, pip_idx in [
             ('index', 8, 6), ('middle', 12, 10), ('ring', 16, 14), ('pinky', 20, 18)
         ]:
-            tip = landmarks[tip_idx]
-            pip = landmarks[pip_idx]
-            if tip is None or pip is None:
-                fingers[finger_name] = False
-            else:
-                fingers[finger_name] = tip['y'] < pip['y'] - 0.01
+            fingers[finger_name] = y[tip_idx] < y[pip_idx] - 0.01
 
         return fingers
 
-    def _check_thumb(self, tip, ip, mcp, wrist, hand_center) -> bool:
-        if tip is None or mcp is None or wrist is None:
-            return False
-        thumb_tip_x = tip['x']
-        thumb_mcp_x = mcp['x']
-        wrist_x = wrist['x']
+    def _check_thumb(self, thumb_tip_x, thumb_mcp_x, wrist_x, hand_center) -> bool:
         is_left_hand = wrist_x < hand_center
         if is_left_hand:
             return thumb_tip_x > thumb_mcp_x + 0.05
         else:
             return thumb_tip_x < thumb_mcp_x - 0.05
 
-    def _classify_gesture(self, fingers: Dict[str, bool], landmarks: List[Dict]) -> Optional[str]:
-        index_tip = landmarks[8]
-        middle_tip = landmarks[12]
-        ring_tip = landmarks[16]
-        pinky_tip = landmarks[20]
-        
-        index_pip = landmarks[6]
-        middle_pip = landmarks[10]
-        ring_pip = landmarks[14]
-        pinky_pip = landmarks[18]
+    def _classify_gesture(self, fingers: Dict[str, bool], landmarks: np.ndarray) -> Optional[str]:
+        y = landmarks[:, 1].tolist()
 
         fingers_vertical = {
-            'index': index_tip['y'] < index_pip['y'] - 0.005,
-            'middle': middle_tip['y'] < middle_pip['y'] - 0.005,
-            'ring': ring_tip['y'] < ring_pip['y'] - 0.005,
-            'pinky': pinky_tip['y'] < pinky_pip['y'] - 0.005
+            'index': y[8] < y[6] - 0.005,
+            'middle': y[12] < y[10] - 0.005,
+            'ring': y[16] < y[14] - 0.005,
+            'pinky': y[20] < y[18] - 0.005
         }
-        
-        index_mcp = landmarks[5]
-        middle_mcp = landmarks[9]
-        ring_mcp = landmarks[13]
-        pinky_mcp = landmarks[17]
-        
+
         fingers_curled = {
-            'index': index_tip['y'] > index_mcp['y'],
-            'middle': middle_tip['y'] > middle_mcp['y'],
-            'ring': ring_tip['y'] > ring_mcp['y'],
-            'pinky': pinky_tip['y'] > pinky_mcp['y']
+            'index': y[8] > y[5],
+            'middle': y[12] > y[9],
+            'ring': y[16] > y[13],
+            'pinky': y[20] > y[17]
         }
 
         if (fingers_vertical['index'] and fingers_vertical['middle'] and 
@@ -129,20 +212,141 @@ class GestureRecognizer:
 
         return "unknown"
 
-    def _is_stable_gesture(self, gesture: Optional[str]) -> bool:
-        if gesture is None or gesture == "unknown":
-            return False
-        if len(self.gesture_history) < self.history_size:
-            return False
-        recent = self.gesture_history[-self.history_size:]
-        return all(g == gesture for g in recent)
-
-    def get_hand_position(self, landmarks: List[Dict]) -> Tuple[float, float]:
-        wrist = landmarks[0]
-        return wrist['x'], wrist['y']
-
-    def get_palm_center(self, landmarks: List[Dict]) -> Tuple[float, float]:
-        palm_points = [0, 1, 5, 9, 13, 17]
-        avg_x = sum(landmarks[i]['x'] for i in palm_points) / len(palm_points)
-        avg_y = sum(landmarks[i]['y'] for i in palm_points) / len(palm_points)
-        return avg_x, avg_y
+    def classify_hands(
+        self,
+        landmarks: np.ndarray,
+        image_size: Tuple[int, int] = (1, 1)
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        labels, masks = self.classify_batch(landmarks)
+        if self.templates is not None and len(labels):
+            matched, _ = self.templates.match(landmarks, self.template_distance, image_size)
+            labels = np.where(np.not_equal(matched, None), matched, labels)
+        return labels, masks
+
+    def classify_batch(self, landmarks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        points = np.asarray(landmarks, dtype=np.float64)
+        points = points.reshape(-1, 21, points.shape[-1])
+        x = points[:, :, 0]
+        y = points[:, :, 1]
+
+        is_left_hand = x[:, 0] < (x[:, 5] + x[:, 17]) / 2
+        thumb = np.where(is_left_hand, x[:, 4] > x[:, 1] + 0.05, x[:, 4] < x[:, 1] - 0.05)
+
+        tips = y[:, FINGER_TIPS]
+        extended = tips < y[:, FINGER_PIPS] - 0.01
+        vertical = tips < y[:, FINGER_PIPS] - 0.005
+        curled = (tips > y[:, FINGER_MCPS]).all(axis=1)
+
+        masks = thumb.astype(np.uint8)
+        for bit in range(4):
+            masks |= extended[:, bit].astype(np.uint8) << (bit + 1)
+
+        index, middle, ring, pinky = vertical.T
+        two_up = index & middle & ~ring & ~pinky
+        all_up = index & middle & ring & pinky
+        codes = np.select(
+            [
+                two_up & thumb,
+                two_up & ~thumb,
+                all_up & thumb,
+                all_up & ~thumb,
+                curled & ~thumb,
+                curled & thumb,
+                index & ~middle & ~ring & ~pinky & ~thumb,
+                two_up & thumb
+            ],
+            np.arange(1, len(GESTURES)),
+            default=0
+        )
+
+        return np.asarray(GESTURES, dtype=object)[codes], masks
+
+    def get_hand_position(self, landmarks: Union[np.ndarray, List[Dict]]) -> Tuple[float, float]:
+        landmarks = as_landmark_array(landmarks)
+        return float(landmarks[0, 0]), float(landmarks[0, 1])
+
+    def get_palm_center(self, landmarks: Union[np.ndarray, List[Dict]]) -> Tuple[float, float]:
+        landmarks = as_landmark_array(landmarks)
+        avg_x, avg_y = landmarks[PALM_POINTS, :2].mean(axis=0)
+        return float(avg_x), float(avg_y)
+
+
+def finger_mask(fingers: Dict[str, bool]) -> int:
+    return sum(1 << bit for bit, name in enumerate(FINGER_NAMES) if fingers[name])
+
+
+def parity_landmarks(count: int = 5000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    points = (rng.uniform(0.3, 0.7, (count, 1, 3)) + rng.normal(0, 0.05, (count, 21, 3))).astype(np.float32)
+
+    def on_threshold(rows, target, reference, offset):
+        value = (points[rows, reference[0], reference[1]].astype(np.float64) + offset).astype(np.float32)
+        ulps = rng.integers(-1, 2, len(rows))
+        value = np.where(ulps < 0, np.nextafter(value, np.float32(-np.inf)), value)
+        value = np.where(ulps > 0, np.nextafter(value, np.float32(np.inf)), value)
+        points[rows, target[0], target[1]] = value
+
+    for tip, pip, mcp in zip(FINGER_TIPS, FINGER_PIPS, FINGER_MCPS):
+        on_threshold(np.flatnonzero(rng.random(count) < 0.15), (tip, 1), (pip, 1), -0.01)
+        on_threshold(np.flatnonzero(rng.random(count) < 0.15), (tip, 1), (pip, 1), -0.005)
+        on_threshold(np.flatnonzero(rng.random(count) < 0.15), (tip, 1), (mcp, 1), 0.0)
+
+    on_threshold(np.flatnonzero(rng.random(count) < 0.15), (4, 0), (1, 0), 0.05)
+    on_threshold(np.flatnonzero(rng.random(count) < 0.15), (4, 0), (1, 0), -0.05)
+    rows = np.flatnonzero(rng.random(count) < 0.1)
+    points[rows, 0, 0] = ((points[rows, 5, 0].astype(np.float64) + points[rows, 17, 0]) / 2).astype(np.float32)
+
+    return points
+
+
+def check_batch_parity(landmarks: Optional[np.ndarray] = None) -> int:
+    if landmarks is None:
+        landmarks = parity_landmarks()
+    landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+
+    labels, masks = GestureRecognizer().classify_batch(landmarks)
+    recognizer = GestureRecognizer(history_size=1)
+
+    mismatches = 0
+    for hand, label, mask in zip(LandmarkSet(landmarks).to_dicts(), labels, masks):
+        recognizer.reset_tracks()
+        expected = recognizer.recognize(hand)
+        fingers = recognizer._get_finger_states(as_landmark_array(hand))
+        if expected != (None if label == "unknown" else label) or finger_mask(fingers) != mask:
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relabel recorded hand landmarks")
+    parser.add_argument("landmarks", type=str, nargs="?", default=None,
+                        help="(N,21,3) landmark array (.npy); --check alone uses a built-in seeded set")
+    parser.add_argument("--output", type=str, default=None, help="Write labels and finger masks to a .npz file")
+    parser.add_argument("--check", action="store_true", help="Compare against the per-hand recognize() path")
+    args = parser.parse_args()
+
+    if args.landmarks is None:
+        if not args.check:
+            parser.error("landmarks is required unless --check is given")
+        landmarks = parity_landmarks()
+    else:
+        landmarks = np.load(args.landmarks, mmap_mode="r")
+    labels, masks = GestureRecognizer().classify_batch(landmarks)
+
+    names, counts = np.unique(labels.astype(str), return_counts=True)
+    for name, count in zip(names, counts):
+        print(f"{name:<12} {count:>8}")
+
+    if args.output:
+        np.savez(args.output, labels=labels.astype(str), finger_masks=masks)
+        print(f"Wrote {len(labels)} labels to {args.output}")
+
+    if args.check:
+        mismatches = check_batch_parity(landmarks)
+        print(f"Parity: {mismatches} mismatches over {len(labels)} hands")
+        if mismatches:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import os
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+WRIST = 0
+MIDDLE_MCP = 9
+FEATURE_SIZE = 20 * 3
+
+
+def hand_features(landmarks: np.ndarray, image_size: Tuple[int, int] = (1, 1)) -> np.ndarray:
+    points = np.asarray(landmarks, dtype=np.float32)
+    points = points.reshape(-1, 21, points.shape[-1])[:, :, :3]
+    points = points - points[:, WRIST:WRIST + 1]
+    aspect = image_size[0] / image_size[1]
+    if aspect != 1:
+        points[:, :, 0] *= aspect
+        points[:, :, 2] *= aspect
+
+    reference = points[:, MIDDLE_MCP, :2]
+    scale = np.maximum(np.linalg.norm(reference, axis=1), 1e-6)
+    ux = (reference[:, 0] / scale)[:, None]
+    uy = (reference[:, 1] / scale)[:, None]
+
+    x = points[:, 1:, 0]
+    y = points[:, 1:, 1]
+    features = np.empty((len(points), 20, 3), dtype=np.float32)
+    features[:, :, 0] = -uy * x + ux * y
+    features[:, :, 1] = -ux * x - uy * y
+    features[:, :, 2] = points[:, 1:, 2]
+    features /= scale[:, None, None]
+
+    return features.reshape(len(points), FEATURE_SIZE)
+
+
+class KDTree:
+    def __init__(self, points: np.ndarray, leaf_size: int = 16):
+        self.points = np.ascontiguousarray(points, dtype=np.float32)
+        self.leaf_size = leaf_size
+        self.indices = np.arange(len(self.points))
+        self._dim: List[int] = []
+        self._split: List[float] = []
+        self._children: List[Tuple[int, int]] = []
+        self._range: List[Tuple[int, int]] = []
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self._dim)
+        self._dim.append(-1)
+        self._split.append(0.0)
+        self._children.append((-1, -1))
+        self._range.append((start, end))
+
+        if end - start <= self.leaf_size:
+            return node
+
+        subset = self.points[self.indices[start:end]]
+        dim = int(np.argmax(subset.max(axis=0) - subset.min(axis=0)))
+        mid = (end - start) // 2
+        order = np.argpartition(subset[:, dim], mid)
+        self.indices[start:end] = self.indices[start:end][order]
+
+        self._dim[node] = dim
+        self._split[node] = float(self.points[self.indices[start + mid], dim])
+        left = self._build(start, start + mid)
+        right = self._build(start + mid, end)
+        self._children[node] = (left, right)
+        return node
+
+    def query(self, points: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        points = np.asarray(points, dtype=np.float32).reshape(-1, self.points.shape[1])
+        k = min(k, len(self.points))
+        distances = np.full((len(points), k), np.inf, dtype=np.float32)
+        indices = np.full((len(points), k), -1, dtype=np.intp)
+
+        for row, point in enumerate(points):
+            best_d = distances[row]
+            best_i = indices[row]
+            stack = [(0, 0.0)] if len(self.points) else []
+
+            while stack:
+                node, bound = stack.pop()
+                if bound > best_d[-1]:
+                    continue
+
+                dim = self._dim[node]
+                if dim < 0:
+                    start, end = self._range[node]
+                    candidates = self.indices[start:end]
+                    d = ((self.points[candidates] - point) ** 2).sum(axis=1)
+                    merged_d = np.concatenate([best_d, d])
+                    merged_i = np.concatenate([best_i, candidates])
+                    keep = np.argsort(merged_d, kind="stable")[:k]
+                    best_d[:] = merged_d[keep]
+                    best_i[:] = merged_i[keep]
+                    continue
+
+                diff = float(point[dim]) - self._split[node]
+                left, right = self._children[node]
+                near, far = (left, right) if diff < 0 else (right, left)
+                stack.append((far, max(bound, diff * diff)))
+                stack.append((near, bound))
+
+        return np.sqrt(distances), indices
+
+
+class GestureTemplateLibrary:
+    def __init__(self, leaf_size: int = 16):
+        self.leaf_size = leaf_size
+        self.features = np.empty((0, FEATURE_SIZE), dtype=np.float32)
+        self.labels = np.empty(0, dtype=object)
+        self._tree: Optional[KDTree] = None
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def add(self, label: str, landmarks: np.ndarray, image_size: Tuple[int, int] = (1, 1)):
+        features = hand_features(landmarks, image_size)
+        self.features = np.concatenate([self.features, features])
+        self.labels = np.concatenate([self.labels, np.full(len(features), label, dtype=object)])
+        self._tree = None
+
+    @property
+    def tree(self) -> KDTree:
+        if self._tree is None:
+            self._tree = KDTree(self.features, self.leaf_size)
+        return self._tree
+
+    def match(
+        self,
+        landmarks: np.ndarray,
+        max_distance: float = 0.5,
+        image_size: Tuple[int, int] = (1, 1)
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        features = hand_features(landmarks, image_size)
+        if not len(self):
+            return np.full(len(features), None, dtype=object), np.full(len(features), np.inf)
+
+        distances, indices = self.tree.query(features)
+        distances = distances[:, 0]
+        labels = self.labels[indices[:, 0]]
+        labels[distances > max_distance] = None
+        return labels, distances
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(f, features=self.features, labels=self.labels.astype(str))
+
+    @classmethod
+    def load(cls, path: str, leaf_size: int = 16, create: bool = False) -> "GestureTemplateLibrary":
+        library = cls(leaf_size)
+        if os.path.exists(path):
+            data = np.load(path)
+            library.features = data['features'].astype(np.float32)
+            library.labels = data['labels'].astype(object)
+        elif not create:
+            raise FileNotFoundError(f"Gesture template library not found: {path}")
+        return library
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage gesture template libraries")
+    parser.add_argument("library", type=str, help="Template library (.npz)")
+    parser.add_argument("--add", type=str, default=None, help="(N,21,3) landmark array (.npy) to add")
+    parser.add_argument("--label", type=str, default=None, help="Gesture label for --add")
+    parser.add_argument("--image-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), default=None,
+                        help="Frame size the --add landmarks were detected on")
+    args = parser.parse_args()
+
+    library = GestureTemplateLibrary.load(args.library, create=args.add is not None)
+    if args.add:
+        if not args.label or not args.image_size:
+            parser.error("--add requires --label and --image-size")
+        library.add(args.label, np.load(args.add), tuple(args.image_size))
+        library.save(args.library)
+
+    names, counts = np.unique(library.labels.astype(str), return_counts=True)
+    for name, count in zip(names, counts):
+        print(f"{name:<12} {count:>8}")
+
+
+if __name__ == "__main__":
+    main()
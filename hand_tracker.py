@@ -1,12 +1,23 @@
 import cv2
 import numpy as np
 import argparse
+import functools
 import sys
+import time
+from typing import Dict, Optional
 
-from camera_capture import CameraCapture
-from feature_detection import HandDetector
-from gesture_recognition import GestureRecognizer
-from animation_renderer import AnimationRenderer
+from startup_profile import profiler
+
+with profiler.measure("import pipeline modules"):
+    from camera_capture import CameraCapture
+    from feature_detection import HandDetector, ScheduledDetector
+    from parallel_detection import ParallelDetector
+    from gesture_recognition import GestureRecognizer
+    from gesture_templates import GestureTemplateLibrary
+    from dynamic_gestures import DynamicGestureRecognizer, hand_distance
+    from animation_renderer import AnimationRenderer
+    from annotation import LandmarkAnnotator
+    from motion_gate import MotionGate
 
 
 class HandTrackerApp:
@@ -14,20 +25,64 @@ class HandTrackerApp:
         self,
         camera_index: int = 0,
         show_animations: bool = True,
-        animation_intensity: float = 1.0
+        animation_intensity: float = 1.0,
+        threaded_capture: bool = False,
+        drop_policy: str = "latest",
+        source: Optional[str] = None,
+        realtime: bool = False,
+        show_display: bool = True,
+        track_roi: bool = False,
+        inference_scale: Optional[float] = None,
+        detect_every: int = 1,
+        detect_budget: Optional[float] = None,
+        workers: int = 0,
+        motion_threshold: Optional[float] = None,
+        gesture_templates: Optional[str] = None,
+        dynamic_gestures: bool = False
     ):
         self.camera_index = camera_index
         self.show_animations = show_animations
         self.animation_intensity = animation_intensity
+        self.show_display = show_display
 
-        self.camera = CameraCapture(use_realsense=False, camera_index=camera_index)
-        self.hand_detector = HandDetector()
-        self.gesture_recognizer = GestureRecognizer()
+        with profiler.measure("CameraCapture"):
+            self.camera = CameraCapture(
+                use_realsense=False,
+                camera_index=camera_index,
+                source=source,
+                realtime=realtime,
+                threaded=threaded_capture,
+                drop_policy=drop_policy
+            )
+        self.hand_detector = None
+        self.parallel_detector = None
+        if workers > 0:
+            self.parallel_detector = ParallelDetector(
+                functools.partial(HandDetector, inference_scale=inference_scale, static_image_mode=True),
+                num_workers=workers
+            )
+        else:
+            with profiler.measure("HandDetector"):
+                self.hand_detector = HandDetector(tracking=track_roi, inference_scale=inference_scale)
+        if self.hand_detector and (detect_every > 1 or detect_budget is not None):
+            self.hand_detector = ScheduledDetector(
+                self.hand_detector,
+                detect_every=detect_every,
+                time_budget=detect_budget
+            )
+        self.motion_gate = MotionGate(threshold=motion_threshold) if motion_threshold is not None else None
+        self.annotator = LandmarkAnnotator.for_hands() if show_display else None
+        templates = GestureTemplateLibrary.load(gesture_templates) if gesture_templates else None
+        self.gesture_recognizer = GestureRecognizer(templates=templates)
         self.animation_renderer = AnimationRenderer()
+        self.dynamic_gestures = dynamic_gestures
+        self.motion_recognizers: Dict[int, DynamicGestureRecognizer] = {}
 
         self.current_gesture = None
         self.gesture_active_time = 0
         self.animation_active = False
+        self.frame_count = 0
+        self.start_time = None
 
     def run(self):
         print("Starting 3D Hand Tracker with Gesture Recognition")
@@ -35,32 +90,41 @@ class HandTrackerApp:
         print("Press 'q' to quit")
         print("Press 'c' to clear animations")
 
-        while True:
-            color_frame, _ = self.camera.get_frame()
+        self.start_time = time.perf_counter()
 
-            if color_frame is None:
-                break
+        for detected_frame, hand_landmarks in self._detections():
+            self.frame_count += 1
 
-            detected_frame, hand_landmarks = self.hand_detector.detect(color_frame)
+            if self.annotator:
+                self.annotator.draw(detected_frame, hand_landmarks)
 
             gesture = None
             hand_pos = None
 
-            if hand_landmarks:
-                for landmarks in hand_landmarks:
-                    gesture = self.gesture_recognizer.recognize(landmarks)
-                    hand_pos = self.gesture_recognizer.get_palm_center(landmarks)
-
-                    if gesture:
-                        cv2.putText(
-                            detected_frame,
-                            f"Gesture: {gesture}",
-                            (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            1,
-                            (0, 255, 0),
-                            2
-                        )
+            if hand_landmarks is None:
+                hand_landmarks = []
+            hands = self.gesture_recognizer.recognize_hands(
+                hand_landmarks, (detected_frame.shape[1], detected_frame.shape[0])
+            )
+            if self.dynamic_gestures:
+                self._update_motion(detected_frame, hands, hand_landmarks)
+
+            for row, hand in enumerate(hands):
+                if not hand['gesture']:
+                    continue
+                if gesture is None:
+                    gesture = hand['gesture']
+                    hand_pos = hand['palm_center']
+
+                cv2.putText(
+                    detected_frame,
+                    f"Hand {hand['track_id']}: {hand['gesture']}",
+                    (10, 30 + 35 * row),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    1,
+                    (0, 255, 0),
+                    2
+                )
 
             gesture_animations = {
                 "i_love_you": self.animation_renderer.create_i_love_you_effect,
@@ -94,6 +158,9 @@ class HandTrackerApp:
                     self.animation_active = False
                     self.animation_renderer.clear_particles()
 
+            if not self.show_display:
+                continue
+
             cv2.imshow("3D Hand Tracker - Gesture Recognition", detected_frame)
 
             key = cv2.waitKey(1) & 0xFF
@@ -106,9 +173,62 @@ class HandTrackerApp:
 
         self.cleanup()
 
+    def _update_motion(self, frame, hands, hand_landmarks):
+        for track_id in list(self.motion_recognizers):
+            if track_id not in self.gesture_recognizer.tracks:
+                del self.motion_recognizers[track_id]
+
+        timestamp = self.camera.last_timestamp
+        image_size = (frame.shape[1], frame.shape[0])
+        for hand, landmarks in zip(hands, hand_landmarks):
+            recognizer = self.motion_recognizers.get(hand['track_id'])
+            if recognizer is None:
+                recognizer = self.motion_recognizers[hand['track_id']] = DynamicGestureRecognizer()
+
+            event = recognizer.update(hand['palm_center'], hand_distance(landmarks, image_size), timestamp)
+            if event:
+                print(f"Hand {hand['track_id']}: {event}")
+                cv2.putText(
+                    frame,
+                    event,
+                    (int(hand['palm_center'][0] * frame.shape[1]), int(hand['palm_center'][1] * frame.shape[0])),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    1,
+                    (255, 200, 0),
+                    2
+                )
+
+    def _frames(self):
+        while True:
+            color_frame, _ = self.camera.get_frame()
+            if color_frame is None:
+                return
+            yield color_frame
+
+    def _detections(self):
+        if self.parallel_detector is not None:
+            for _, frame, hand_landmarks in self.parallel_detector.process(self._frames()):
+                yield frame, hand_landmarks
+            return
+
+        hand_landmarks = None
+        for color_frame in self._frames():
+            changed = self.motion_gate.changed(color_frame) if self.motion_gate else True
+            if changed or hand_landmarks is None:
+                color_frame, hand_landmarks = self.hand_detector.detect(color_frame)
+            yield color_frame, hand_landmarks
+
     def cleanup(self):
+        if self.start_time is not None and self.frame_count:
+            elapsed = time.perf_counter() - self.start_time
+            print(f"Processed {self.frame_count} frames in {elapsed:.2f}s ({self.frame_count / elapsed:.1f} FPS)")
+        if self.motion_gate:
+            print(self.motion_gate.summary())
+        if self.camera.threaded:
+            print(f"Dropped frames: {self.camera.dropped_frames}")
         self.camera.release()
-        cv2.destroyAllWindows()
+        if self.show_display:
+            cv2.destroyAllWindows()
         print("Application closed")
 
 
@@ -117,15 +237,65 @@ def main():
     parser.add_argument("--camera", type=int, default=0, help="Camera index")
     parser.add_argument("--no-animations", action="store_true", help="Disable animations")
     parser.add_argument("--intensity", type=float, default=1.0, help="Animation intensity (0.1-2.0)")
+    parser.add_argument("--source", type=str, default=None, help="Video file or image directory to replay")
+    parser.add_argument("--realtime", action="store_true", help="Pace replay at the recorded frame rate")
+    parser.add_argument("--no-display", action="store_true", help="Run without an output window")
+    parser.add_argument("--track-roi", action="store_true", help="Detect hands in a crop around the last position")
+    parser.add_argument("--inference-scale", type=float, default=None,
+                        help="Downscale factor for detector input (e.g. 0.5)")
+    parser.add_argument("--detect-every", type=int, default=1,
+                        help="Run the hand detector every N frames and predict in between")
+    parser.add_argument("--detect-budget", type=float, default=None,
+                        help="Per-frame detection budget in ms; adapts the detection interval")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Detect in N worker processes (for recorded --source footage)")
+    parser.add_argument("--motion-threshold", type=float, default=None,
+                        help="Skip detection on static frames (pixel difference threshold, e.g. 12)")
+    parser.add_argument("--gesture-templates", type=str, default=None,
+                        help="Match gestures against a template library (.npz), falling back to the rules")
+    parser.add_argument("--dynamic-gestures", action="store_true",
+                        help="Recognize swipe, circle and push motions per hand")
+    parser.add_argument("--startup-profile", action="store_true", help="Print import and model load times")
+    parser.add_argument("--threaded-capture", action="store_true", help="Capture frames on a background thread")
+    parser.add_argument("--drop-policy", type=str, default="latest", choices=["latest", "fifo"],
+                        help="Threaded capture: drop stale frames (latest) or block capture until frames are consumed (fifo)")
 
     args = parser.parse_args()
 
+    if args.workers > 0:
+        ignored = [
+            flag for flag, enabled in [
+                ("--track-roi", args.track_roi),
+                ("--detect-every", args.detect_every > 1),
+                ("--detect-budget", args.detect_budget is not None),
+                ("--motion-threshold", args.motion_threshold is not None)
+            ] if enabled
+        ]
+        if ignored:
+            parser.error(f"--workers cannot be combined with {', '.join(ignored)}")
+
     app = HandTrackerApp(
         camera_index=args.camera,
         show_animations=not args.no_animations,
-        animation_intensity=args.intensity
+        animation_intensity=args.intensity,
+        threaded_capture=args.threaded_capture,
+        drop_policy=args.drop_policy,
+        source=args.source,
+        realtime=args.realtime,
+        show_display=not args.no_display,
+        track_roi=args.track_roi,
+        inference_scale=args.inference_scale,
+        detect_every=args.detect_every,
+        detect_budget=args.detect_budget / 1000.0 if args.detect_budget else None,
+        workers=args.workers,
+        motion_threshold=args.motion_threshold,
+        gesture_templates=args.gesture_templates,
+        dynamic_gestures=args.dynamic_gestures
     )
 
+    if args.startup_profile:
+        print(profiler.report())
+
     app.run()
 
 
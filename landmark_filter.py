@@ -0,0 +1,84 @@
+import math
+import numpy as np
+from typing import Optional
+
+
+class OneEuroLandmarkFilter:
+    def __init__(
+        self,
+        min_cutoff: float = 1.0,
+        beta: float = 10.0,
+        d_cutoff: float = 1.0,
+        max_prediction: float = 0.25,
+        max_match_distance: float = 0.2
+    ):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_prediction = max_prediction
+        self.max_match_distance = max_match_distance
+        self.reset()
+
+    def reset(self):
+        self.value: Optional[np.ndarray] = None
+        self.velocity: Optional[np.ndarray] = None
+        self.timestamp = 0.0
+
+    @staticmethod
+    def _alpha(cutoff, dt: float):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def match(self, points: np.ndarray, timestamp: float):
+        if self.value is None or self.value.shape[1:] != points.shape[1:]:
+            return
+
+        previous = self.predict(timestamp)[:, :, :2].mean(axis=1)
+        current = points[:, :, :2].mean(axis=1)
+        distances = np.linalg.norm(previous[:, None] - current[None], axis=2)
+
+        value = points.copy()
+        velocity = np.zeros_like(points)
+        used_previous = set()
+        used_current = set()
+        for flat in np.argsort(distances, axis=None):
+            row, col = divmod(int(flat), len(current))
+            if distances[row, col] > self.max_match_distance:
+                break
+            if row in used_previous or col in used_current:
+                continue
+            used_previous.add(row)
+            used_current.add(col)
+            value[col] = self.value[row]
+            velocity[col] = self.velocity[row]
+
+        self.value = value
+        self.velocity = velocity
+
+    def update(self, points: np.ndarray, timestamp: float) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float32)
+        if points.ndim == 3:
+            self.match(points, timestamp)
+        if self.value is None or self.value.shape != points.shape:
+            self.value = points.copy()
+            self.velocity = np.zeros_like(points)
+            self.timestamp = timestamp
+            return self.value.copy()
+
+        dt = max(timestamp - self.timestamp, 1e-6)
+        raw_velocity = (points - self.value) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        self.velocity += a_d * (raw_velocity - self.velocity)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.velocity)
+        a = self._alpha(cutoff, dt)
+        self.value += a * (points - self.value)
+        self.timestamp = timestamp
+
+        return self.value.copy()
+
+    def predict(self, timestamp: float) -> Optional[np.ndarray]:
+        if self.value is None:
+            return None
+        dt = min(max(timestamp - self.timestamp, 0.0), self.max_prediction)
+        return self.value + self.velocity * dt
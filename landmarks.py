@@ -0,0 +1,108 @@
+import numpy as np
+from typing import Optional, List, Dict, Iterator, Sequence, Union
+
+
+NUM_HAND_LANDMARKS = 21
+NUM_FACE_LANDMARKS = 468
+
+UNKNOWN = -1
+LEFT = 0
+RIGHT = 1
+HANDEDNESS_LABELS = {UNKNOWN: "Unknown", LEFT: "Left", RIGHT: "Right"}
+
+HAND_CONNECTIONS = [
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20)
+]
+
+
+class LandmarkSet:
+    def __init__(
+        self,
+        points: np.ndarray,
+        handedness: Optional[np.ndarray] = None,
+        scores: Optional[np.ndarray] = None
+    ):
+        self.points = np.asarray(points, dtype=np.float32)
+        if self.points.ndim != 3 or self.points.shape[2] != 3:
+            raise ValueError(f"Expected (N, K, 3) landmarks, got {self.points.shape}")
+        n = self.points.shape[0]
+        self.handedness = (
+            np.full(n, UNKNOWN, dtype=np.int8) if handedness is None
+            else np.asarray(handedness, dtype=np.int8)
+        )
+        self.scores = (
+            np.ones(n, dtype=np.float32) if scores is None
+            else np.asarray(scores, dtype=np.float32)
+        )
+
+    @classmethod
+    def empty(cls, num_landmarks: int = NUM_HAND_LANDMARKS) -> "LandmarkSet":
+        return cls(np.zeros((0, num_landmarks, 3), dtype=np.float32))
+
+    @classmethod
+    def from_mediapipe(
+        cls,
+        multi_landmarks,
+        multi_handedness=None,
+        num_landmarks: int = NUM_HAND_LANDMARKS
+    ) -> "LandmarkSet":
+        if not multi_landmarks:
+            return cls.empty(num_landmarks)
+
+        n = len(multi_landmarks)
+        points = np.empty((n, num_landmarks, 3), dtype=np.float32)
+        handedness = np.full(n, UNKNOWN, dtype=np.int8)
+        scores = np.ones(n, dtype=np.float32)
+
+        for i, item in enumerate(multi_landmarks):
+            points[i] = [(lm.x, lm.y, lm.z) for lm in item.landmark[:num_landmarks]]
+
+        if multi_handedness:
+            for i, item in enumerate(multi_handedness[:n]):
+                classification = item.classification[0]
+                handedness[i] = LEFT if classification.label == "Left" else RIGHT
+                scores[i] = classification.score
+
+        return cls(points, handedness, scores)
+
+    def __len__(self) -> int:
+        return self.points.shape[0]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return iter(self.points)
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self.points[index]
+
+    @property
+    def num_landmarks(self) -> int:
+        return self.points.shape[1]
+
+    @property
+    def xy(self) -> np.ndarray:
+        return self.points[..., :2]
+
+    def handedness_labels(self) -> List[str]:
+        return [HANDEDNESS_LABELS[int(h)] for h in self.handedness]
+
+    def to_dicts(self) -> List[List[Dict]]:
+        return [
+            [{'x': float(x), 'y': float(y), 'z': float(z)} for x, y, z in item]
+            for item in self.points.tolist()
+        ]
+
+
+def as_landmark_array(landmarks: Union[np.ndarray, Sequence[Dict]]) -> Optional[np.ndarray]:
+    if isinstance(landmarks, np.ndarray):
+        return landmarks
+    if not landmarks:
+        return None
+    if not all(lm is not None and 'x' in lm and 'y' in lm for lm in landmarks):
+        return None
+    return np.array(
+        [(lm['x'], lm['y'], lm.get('z', 0.0)) for lm in landmarks], dtype=np.float32
+    )
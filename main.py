@@ -4,11 +4,19 @@ from typing import Optional
 import argparse
 import sys
 
-from camera_capture import CameraCapture
-from depth_estimation import DepthEstimator
-from feature_detection import HandDetector, FaceDetector, ObjectDetector
-from coordinate_conversion import CoordinateConverter
-from visualization_3d import Visualizer3D, PointCloudProcessor, LandmarkVisualizer
+from startup_profile import profiler
+
+with profiler.measure("import pipeline modules"):
+    from camera_capture import CameraCapture
+    from depth_estimation import DepthEstimator, AsyncDepthEstimator
+    from landmarks import LandmarkSet
+    from feature_detection import HandDetector, FaceDetector, ObjectDetector
+    from coordinate_conversion import CoordinateConverter
+    from depth_registration import DepthRegistration
+    from frame_scaling import ScaledFrame
+    from annotation import LandmarkAnnotator, DetectionAnnotator
+    from motion_gate import MotionGate
+    from visualization_3d import Visualizer3D, PointCloudProcessor, LandmarkVisualizer
 
 
 class Recognition3DApp:
@@ -18,7 +26,23 @@ class Recognition3DApp:
         detection_mode: str = "hand",
         use_midas: bool = True,
         show_2d: bool = True,
-        show_3d: bool = True
+        show_3d: bool = True,
+        threaded_capture: bool = False,
+        source: Optional[str] = None,
+        realtime: bool = False,
+        record_path: Optional[str] = None,
+        depth_codec: str = "raw",
+        inference_scale: Optional[float] = None,
+        depth_inference_scale: Optional[float] = None,
+        motion_threshold: Optional[float] = None,
+        async_depth: bool = False,
+        depth_motion_compensation: bool = False,
+        depth_model: str = "DPT_Large",
+        depth_model_dir: Optional[str] = None,
+        torch_threads: Optional[int] = None,
+        depth_precision: str = "fp32",
+        depth_window: int = 1,
+        register_depth: Optional[str] = None
     ):
         self.use_realsense = use_realsense
         self.detection_mode = detection_mode
@@ -26,25 +50,67 @@ class Recognition3DApp:
         self.show_2d = show_2d
         self.show_3d = show_3d
 
-        self.camera = CameraCapture(use_realsense=use_realsense)
-        self.depth_estimator = DepthEstimator() if use_midas and not use_realsense else None
-        self.coord_converter = CoordinateConverter()
-
-        intrinsics = self.camera.get_intrinsics()
+        with profiler.measure("CameraCapture"):
+            self.camera = CameraCapture(
+                use_realsense=use_realsense,
+                source=source,
+                realtime=realtime,
+                threaded=threaded_capture
+            )
+        self.has_depth = self.camera.has_depth
+        if record_path:
+            self.camera.start_recording(record_path, depth_codec=depth_codec)
+        with profiler.measure("DepthEstimator"):
+            self.depth_estimator = (
+                DepthEstimator(
+                    model_type=depth_model,
+                    inference_scale=depth_inference_scale,
+                    model_dir=depth_model_dir,
+                    num_threads=torch_threads,
+                    precision=depth_precision
+                )
+                if use_midas and not self.has_depth else None
+            )
+        self.async_depth = None
+        if async_depth and self.depth_estimator:
+            self.async_depth = AsyncDepthEstimator(self.depth_estimator, depth_motion_compensation)
+        registration = None
+        if register_depth == "device":
+            calibration = self.camera.get_calibration()
+            if calibration is None:
+                raise RuntimeError("Depth registration from the device requires a RealSense camera")
+            registration = DepthRegistration.from_calibration(calibration)
+        elif register_depth:
+            registration = DepthRegistration.load(register_depth)
+        self.coord_converter = CoordinateConverter(depth_window=depth_window, registration=registration)
+
+        intrinsics = registration.color_intrinsics if registration else self.camera.get_intrinsics()
         if intrinsics:
             self.coord_converter.set_intrinsics(
                 intrinsics['fx'], intrinsics['fy'],
                 intrinsics['cx'], intrinsics['cy']
             )
 
-        if detection_mode == "hand":
-            self.detector = HandDetector()
-        elif detection_mode == "face":
-            self.detector = FaceDetector()
-        elif detection_mode == "object":
-            self.detector = ObjectDetector()
-        else:
+        detectors = {
+            "hand": HandDetector,
+            "face": FaceDetector,
+            "object": ObjectDetector
+        }
+        if detection_mode not in detectors:
             raise ValueError(f"Unknown detection mode: {detection_mode}")
+        with profiler.measure(detectors[detection_mode].__name__):
+            self.detector = detectors[detection_mode](inference_scale=inference_scale)
+
+        annotators = {
+            "hand": LandmarkAnnotator.for_hands,
+            "face": LandmarkAnnotator.for_faces,
+            "object": DetectionAnnotator
+        }
+        self.annotator = annotators[detection_mode]() if show_2d else None
+
+        self.motion_gate = MotionGate(threshold=motion_threshold) if motion_threshold is not None else None
+        self._last_detections = None
+        self._last_depth_map = None
 
         self.visualizer_3d = Visualizer3D() if show_3d else None
         self.pcd_processor = PointCloudProcessor()
@@ -53,7 +119,7 @@ class Recognition3DApp:
     def run(self):
         print(f"Starting 3D Recognition System")
         print(f"Mode: {self.detection_mode}")
-        print(f"Depth: {'RealSense' if self.use_realsense else 'MiDaS' if self.use_midas else 'None'}")
+        print(f"Depth: {'Sensor' if self.has_depth else 'MiDaS' if self.use_midas else 'None'}")
         print("Press 'q' to quit")
 
         try:
@@ -63,21 +129,36 @@ class Recognition3DApp:
                 if color_frame is None:
                     break
 
-                detected_frame, detections = self._process_detection(color_frame)
+                frame = ScaledFrame(color_frame)
+                changed = self.motion_gate.changed(frame) if self.motion_gate else True
+
+                if changed or self._last_detections is None:
+                    detected_frame, detections = self._process_detection(frame)
+                    self._last_detections = detections
+                else:
+                    detected_frame, detections = color_frame, self._last_detections
 
-                if self.use_realsense:
+                if self.has_depth:
                     depth_map = depth_frame
+                elif self.async_depth:
+                    anchor = self._detection_anchor(detections)
+                    if changed:
+                        self.async_depth.submit(frame, anchor)
+                    depth_map, _ = self.async_depth.latest(anchor)
                 elif self.use_midas and self.depth_estimator:
-                    depth_map = self.depth_estimator.estimate_depth(color_frame)
+                    if changed or self._last_depth_map is None:
+                        self._last_depth_map = self.depth_estimator.predict(frame)
+                    depth_map = self._last_depth_map
                 else:
                     depth_map = None
 
                 points_3d = self._convert_to_3d(detections, depth_map, depth_frame, color_frame.shape)
 
-                if self.show_3d and points_3d and self.visualizer_3d:
+                if self.show_3d and len(points_3d) and self.visualizer_3d:
                     self._update_3d_visualization(points_3d)
 
                 if self.show_2d:
+                    self.annotator.draw(detected_frame, detections)
                     cv2.imshow("2D Detection", detected_frame)
                     if cv2.waitKey(1) & 0xFF == ord('q'):
                         break
@@ -91,12 +172,18 @@ class Recognition3DApp:
         else:
             return self.detector.detect(frame)
 
+    def _detection_anchor(self, detections):
+        if isinstance(detections, LandmarkSet) and len(detections):
+            x, y = detections.xy.reshape(-1, 2).mean(axis=0)
+            return float(x), float(y)
+        return None
+
     def _convert_to_3d(self, detections, depth_map, depth_frame, image_shape):
-        if not detections:
-            return []
+        if not len(detections):
+            return np.empty((0, 3), dtype=np.float32)
 
         h, w = image_shape[:2]
-        points_3d = self.coord_converter.convert_2d_to_3d(
+        points_3d = self.coord_converter.convert_detections(
             detections,
             depth_map=depth_map,
             depth_frame=depth_frame,
@@ -107,20 +194,24 @@ class Recognition3DApp:
         return points_3d
 
     def _update_3d_visualization(self, points_3d):
-        if not points_3d:
+        if not len(points_3d):
             return
 
-        points_array = np.array([[p['x'], p['y'], p['z']] for p in points_3d])
-        colors = np.random.rand(len(points_array), 3)
+        colors = np.random.rand(len(points_3d), 3)
 
-        self.visualizer_3d.update_point_cloud(points_array, colors)
+        self.visualizer_3d.update_point_cloud(points_3d, colors)
         self.visualizer_3d.render_frame()
 
     def cleanup(self):
+        if self.async_depth:
+            self.async_depth.close()
+        if self.motion_gate:
+            print(self.motion_gate.summary())
         self.camera.release()
         if self.visualizer_3d:
             self.visualizer_3d.close()
-        cv2.destroyAllWindows()
+        if self.show_2d:
+            cv2.destroyAllWindows()
         print("Cleanup complete")
 
 
@@ -134,6 +225,36 @@ def main():
     parser.add_argument("--no-2d", action="store_true", help="Disable 2D visualization")
     parser.add_argument("--no-3d", action="store_true", help="Disable 3D visualization")
     parser.add_argument("--camera", type=int, default=0, help="Webcam index")
+    parser.add_argument("--source", type=str, default=None,
+                        help="Video file, image directory or recorded depth session to replay")
+    parser.add_argument("--realtime", action="store_true", help="Pace replay at the recorded frame rate")
+    parser.add_argument("--record", type=str, default=None, help="Record the color+depth session to a directory")
+    parser.add_argument("--depth-codec", type=str, default="raw", choices=["raw", "png"],
+                        help="Depth storage for recorded sessions")
+    parser.add_argument("--inference-scale", type=float, default=None,
+                        help="Downscale factor for detector input (e.g. 0.5)")
+    parser.add_argument("--depth-inference-scale", type=float, default=None,
+                        help="Downscale factor for MiDaS input")
+    parser.add_argument("--motion-threshold", type=float, default=None,
+                        help="Skip detection and depth on static frames (pixel difference threshold)")
+    parser.add_argument("--async-depth", action="store_true",
+                        help="Run MiDaS on a background thread and reuse the latest depth map")
+    parser.add_argument("--depth-motion-compensation", action="store_true",
+                        help="Shift stale async depth maps by the hand's 2D motion")
+    parser.add_argument("--depth-model", type=str, default="DPT_Large",
+                        choices=["DPT_Large", "DPT_Hybrid", "MiDaS", "MiDaS_small"],
+                        help="MiDaS model type")
+    parser.add_argument("--depth-model-dir", type=str, default=None,
+                        help="Load an exported MiDaS model (see depth_estimation.py) instead of torch.hub")
+    parser.add_argument("--torch-threads", type=int, default=None, help="Torch intra-op thread count")
+    parser.add_argument("--depth-precision", type=str, default="fp32", choices=["fp32", "bf16", "int8"],
+                        help="MiDaS inference precision")
+    parser.add_argument("--depth-window", type=int, default=1,
+                        help="Average valid RealSense depth over a KxK window around each point")
+    parser.add_argument("--register-depth", type=str, nargs="?", const="device", default=None,
+                        help="Align RealSense depth to the color image (device calibration or a calibration JSON)")
+    parser.add_argument("--startup-profile", action="store_true", help="Print import and model load times")
+    parser.add_argument("--threaded-capture", action="store_true", help="Capture frames on a background thread")
 
     args = parser.parse_args()
 
@@ -145,9 +266,28 @@ def main():
         detection_mode=args.mode,
         use_midas=use_midas,
         show_2d=not args.no_2d,
-        show_3d=not args.no_3d
+        show_3d=not args.no_3d,
+        threaded_capture=args.threaded_capture,
+        source=args.source,
+        realtime=args.realtime,
+        record_path=args.record,
+        depth_codec=args.depth_codec,
+        inference_scale=args.inference_scale,
+        depth_inference_scale=args.depth_inference_scale,
+        motion_threshold=args.motion_threshold,
+        async_depth=args.async_depth,
+        depth_motion_compensation=args.depth_motion_compensation,
+        depth_model=args.depth_model,
+        depth_model_dir=args.depth_model_dir,
+        torch_threads=args.torch_threads,
+        depth_precision=args.depth_precision,
+        depth_window=args.depth_window,
+        register_depth=args.register_depth
     )
 
+    if args.startup_profile:
+        print(profiler.report())
+
     app.run()
 
 
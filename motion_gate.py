@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+from typing import Optional, Tuple, Union
+
+from frame_scaling import ScaledFrame, as_scaled_frame
+
+
+class MotionGate:
+    def __init__(
+        self,
+        threshold: float = 12.0,
+        min_changed_fraction: float = 0.002,
+        size: Tuple[int, int] = (64, 48),
+        max_skip: Optional[int] = 90
+    ):
+        self.threshold = threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.size = size
+        self.max_skip = max_skip
+        self.frames = 0
+        self.skipped = 0
+        self._reference: Optional[np.ndarray] = None
+        self._since_refresh = 0
+
+    def changed(self, image: Union[np.ndarray, ScaledFrame]) -> bool:
+        small = as_scaled_frame(image).resized(self.size)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        self.frames += 1
+
+        if self._reference is not None and self._reference.shape == gray.shape:
+            diff = cv2.absdiff(gray, self._reference)
+            changed_pixels = np.count_nonzero(diff > self.threshold)
+            static = changed_pixels < self.min_changed_fraction * diff.size
+            if static and (self.max_skip is None or self._since_refresh < self.max_skip):
+                self._since_refresh += 1
+                self.skipped += 1
+                return False
+
+        self._reference = gray
+        self._since_refresh = 0
+        return True
+
+    def reset(self):
+        self._reference = None
+        self._since_refresh = 0
+
+    def summary(self) -> str:
+        return f"Motion gate skipped {self.skipped}/{self.frames} inferences"
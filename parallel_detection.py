@@ -0,0 +1,139 @@
+import multiprocessing as mp
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Callable, Iterable, Iterator, Optional, Tuple, List, Any
+
+
+def _worker_loop(
+    factory: Callable,
+    method: str,
+    shm_names: List[str],
+    shape: Tuple[int, ...],
+    dtype: str,
+    task_queue,
+    result_queue
+):
+    blocks = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    slots = [np.ndarray(shape, dtype=dtype, buffer=block.buf) for block in blocks]
+
+    try:
+        detector = factory()
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            sequence, slot = task
+            try:
+                _, result = getattr(detector, method)(slots[slot])
+                result_queue.put((sequence, slot, result, None))
+            except Exception as e:
+                result_queue.put((sequence, slot, None, e))
+    except Exception as e:
+        result_queue.put((-1, -1, None, e))
+    finally:
+        del slots
+        for block in blocks:
+            block.close()
+        result_queue.cancel_join_thread()
+
+
+class ParallelDetector:
+    def __init__(
+        self,
+        factory: Callable,
+        num_workers: Optional[int] = None,
+        slots_per_worker: int = 2,
+        method: str = "detect"
+    ):
+        self.factory = factory
+        self.num_workers = num_workers or max((os.cpu_count() or 2) - 1, 1)
+        self.num_slots = self.num_workers * slots_per_worker
+        self.method = method
+        self._context = mp.get_context("spawn")
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self._slots: List[np.ndarray] = []
+        self._workers = []
+        self._task_queue = None
+        self._result_queue = None
+
+    def _start(self, shape: Tuple[int, ...], dtype: np.dtype):
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        self._blocks = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(self.num_slots)]
+        self._slots = [np.ndarray(shape, dtype=dtype, buffer=block.buf) for block in self._blocks]
+        self._task_queue = self._context.Queue()
+        self._result_queue = self._context.Queue()
+
+        names = [block.name for block in self._blocks]
+        for _ in range(self.num_workers):
+            worker = self._context.Process(
+                target=_worker_loop,
+                args=(
+                    self.factory, self.method, names, shape, np.dtype(dtype).str,
+                    self._task_queue, self._result_queue
+                ),
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def process(self, frames: Iterable[np.ndarray]) -> Iterator[Tuple[int, np.ndarray, Any]]:
+        frames = iter(frames)
+        free: List[int] = []
+        pending = {}
+        in_flight = 0
+        submitted = 0
+        next_sequence = 0
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and (free or not self._slots):
+                    frame = next(frames, None)
+                    if frame is None:
+                        exhausted = True
+                        break
+                    if not self._slots:
+                        self._start(frame.shape, frame.dtype)
+                        free = list(range(self.num_slots))
+                    if frame.shape != self._slots[0].shape:
+                        raise ValueError(f"Frame shape {frame.shape} does not match {self._slots[0].shape}")
+
+                    slot = free.pop()
+                    np.copyto(self._slots[slot], frame)
+                    self._task_queue.put((submitted, slot))
+                    submitted += 1
+                    in_flight += 1
+
+                while next_sequence in pending:
+                    slot, result = pending.pop(next_sequence)
+                    yield next_sequence, self._slots[slot], result
+                    free.append(slot)
+                    next_sequence += 1
+
+                if in_flight == 0:
+                    if exhausted:
+                        break
+                    continue
+
+                sequence, slot, result, error = self._result_queue.get()
+                if error is not None:
+                    raise error
+                pending[sequence] = (slot, result)
+                in_flight -= 1
+        finally:
+            self.close()
+
+    def close(self):
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5.0)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+        self._slots = []
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
@@ -0,0 +1,200 @@
+import cv2
+import json
+import os
+import time
+import numpy as np
+from typing import Optional, Tuple, Dict, List
+
+
+SESSION_FORMAT = 'chunked-rgbd'
+SESSION_VERSION = 1
+
+
+class SessionRecorder:
+    def __init__(
+        self,
+        path: str,
+        intrinsics: Optional[Dict] = None,
+        chunk_size: int = 300,
+        depth_codec: str = "raw",
+        color_codec: str = ".jpg",
+        jpeg_quality: int = 90
+    ):
+        if depth_codec not in ("raw", "png"):
+            raise ValueError(f"Unknown depth codec: {depth_codec}")
+        self.path = path
+        self.intrinsics = intrinsics
+        self.chunk_size = chunk_size
+        self.depth_codec = depth_codec
+        self.color_codec = color_codec
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if color_codec == ".jpg" else []
+
+        self.frame_count = 0
+        self.timestamps: List[float] = []
+        self.shape = None
+        self._chunk = -1
+        self._color_file = None
+        self._depth_file = None
+        self._color_offsets: List[int] = []
+        self._depth_offsets: List[int] = []
+
+        os.makedirs(path, exist_ok=True)
+
+    def write(
+        self,
+        color_image: np.ndarray,
+        depth_image: np.ndarray,
+        timestamp: Optional[float] = None
+    ):
+        if depth_image.dtype != np.uint16:
+            raise ValueError("Depth image must be z16 (uint16)")
+        if self.shape is None:
+            self.shape = depth_image.shape
+        elif depth_image.shape != self.shape:
+            raise ValueError(f"Depth shape {depth_image.shape} does not match {self.shape}")
+
+        if self.frame_count % self.chunk_size == 0:
+            self._open_chunk(self.frame_count // self.chunk_size)
+
+        ok, encoded = cv2.imencode(self.color_codec, color_image, self.encode_params)
+        if not ok:
+            raise RuntimeError("Failed to encode color frame")
+        self._color_offsets.append(self._color_file.tell())
+        self._color_file.write(encoded.tobytes())
+
+        if self.depth_codec == "raw":
+            self._depth_file.write(np.ascontiguousarray(depth_image).tobytes())
+        else:
+            ok, encoded = cv2.imencode(".png", depth_image)
+            if not ok:
+                raise RuntimeError("Failed to encode depth frame")
+            self._depth_offsets.append(self._depth_file.tell())
+            self._depth_file.write(encoded.tobytes())
+
+        self.timestamps.append(time.perf_counter() if timestamp is None else timestamp)
+        self.frame_count += 1
+
+    def _open_chunk(self, chunk: int):
+        self._close_chunk()
+        self._chunk = chunk
+        self._color_file = open(_chunk_path(self.path, 'color', chunk, 'pack'), 'wb')
+        depth_ext = 'z16' if self.depth_codec == "raw" else 'pack'
+        self._depth_file = open(_chunk_path(self.path, 'depth', chunk, depth_ext), 'wb')
+
+    def _close_chunk(self):
+        if self._color_file is None:
+            return
+        self._color_offsets.append(self._color_file.tell())
+        np.save(_chunk_path(self.path, 'color', self._chunk, 'npy'), np.array(self._color_offsets, dtype=np.int64))
+        self._color_file.close()
+        self._color_file = None
+        self._color_offsets = []
+
+        if self.depth_codec != "raw":
+            self._depth_offsets.append(self._depth_file.tell())
+            np.save(_chunk_path(self.path, 'depth', self._chunk, 'npy'), np.array(self._depth_offsets, dtype=np.int64))
+            self._depth_offsets = []
+        self._depth_file.close()
+        self._depth_file = None
+
+    def close(self):
+        self._close_chunk()
+        start = self.timestamps[0] if self.timestamps else 0.0
+        np.save(os.path.join(self.path, 'timestamps.npy'), np.array(self.timestamps, dtype=np.float64) - start)
+
+        height, width = self.shape if self.shape else (0, 0)
+        meta = {
+            'format': SESSION_FORMAT,
+            'version': SESSION_VERSION,
+            'frames': self.frame_count,
+            'chunk_size': self.chunk_size,
+            'width': width,
+            'height': height,
+            'depth_codec': self.depth_codec,
+            'color_codec': self.color_codec,
+            'intrinsics': self.intrinsics
+        }
+        with open(os.path.join(self.path, 'session.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+
+class SessionReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'session.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != SESSION_FORMAT:
+            raise RuntimeError(f"Not a recorded session: {path}")
+
+        self.frame_count = meta['frames']
+        self.chunk_size = meta['chunk_size']
+        self.width = meta['width']
+        self.height = meta['height']
+        self.depth_codec = meta['depth_codec']
+        self.intrinsics = meta.get('intrinsics')
+        self.timestamps = np.load(os.path.join(path, 'timestamps.npy'), mmap_mode='r')
+
+        self._color_chunks: Dict[int, Tuple[np.memmap, np.ndarray]] = {}
+        self._depth_chunks: Dict[int, Tuple[np.memmap, Optional[np.ndarray]]] = {}
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        if not 0 <= index < self.frame_count:
+            raise IndexError(f"Frame {index} out of range")
+        return divmod(index, self.chunk_size)
+
+    def _color_chunk(self, chunk: int) -> Tuple[np.memmap, np.ndarray]:
+        if chunk not in self._color_chunks:
+            data = np.memmap(_chunk_path(self.path, 'color', chunk, 'pack'), dtype=np.uint8, mode='r')
+            offsets = np.load(_chunk_path(self.path, 'color', chunk, 'npy'))
+            self._color_chunks[chunk] = (data, offsets)
+        return self._color_chunks[chunk]
+
+    def _depth_chunk(self, chunk: int) -> Tuple[np.memmap, Optional[np.ndarray]]:
+        if chunk not in self._depth_chunks:
+            if self.depth_codec == "raw":
+                data = np.memmap(
+                    _chunk_path(self.path, 'depth', chunk, 'z16'), dtype=np.uint16, mode='r'
+                ).reshape(-1, self.height, self.width)
+                self._depth_chunks[chunk] = (data, None)
+            else:
+                data = np.memmap(_chunk_path(self.path, 'depth', chunk, 'pack'), dtype=np.uint8, mode='r')
+                offsets = np.load(_chunk_path(self.path, 'depth', chunk, 'npy'))
+                self._depth_chunks[chunk] = (data, offsets)
+        return self._depth_chunks[chunk]
+
+    def color(self, index: int) -> np.ndarray:
+        chunk, offset = self._locate(index)
+        data, offsets = self._color_chunk(chunk)
+        return cv2.imdecode(data[offsets[offset]:offsets[offset + 1]], cv2.IMREAD_COLOR)
+
+    def depth(self, index: int) -> np.ndarray:
+        chunk, offset = self._locate(index)
+        data, offsets = self._depth_chunk(chunk)
+        if offsets is None:
+            return data[offset]
+        return cv2.imdecode(data[offsets[offset]:offsets[offset + 1]], cv2.IMREAD_UNCHANGED)
+
+    def read(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.color(index), self.depth(index)
+
+    def timestamp(self, index: int) -> float:
+        return float(self.timestamps[index])
+
+    def close(self):
+        self._color_chunks.clear()
+        self._depth_chunks.clear()
+
+
+def is_recorded_session(path: str) -> bool:
+    meta_path = os.path.join(path, 'session.json')
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        return json.load(f).get('format') == SESSION_FORMAT
+
+
+def _chunk_path(path: str, stream: str, chunk: int, ext: str) -> str:
+    return os.path.join(path, f"{stream}_{chunk:05d}.{ext}")
@@ -0,0 +1,58 @@
+import importlib
+import time
+from contextlib import contextmanager
+from typing import List, Tuple, Optional
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.timings: List[Tuple[str, float]] = []
+        self._depth = 0
+
+    @contextmanager
+    def measure(self, label: str):
+        index = len(self.timings)
+        self.timings.append(("  " * self._depth + label, 0.0))
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.timings[index] = (self.timings[index][0], time.perf_counter() - start)
+
+    def report(self) -> str:
+        lines = ["Startup profile:"]
+        for label, elapsed in self.timings:
+            lines.append(f"  {label:<40} {elapsed * 1000:8.1f} ms")
+        total = sum(elapsed for label, elapsed in self.timings if not label.startswith(" "))
+        lines.append(f"  {'total':<40} {total * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+profiler = StartupProfiler()
+
+
+class LazyModule:
+    def __init__(self, name: str, package: Optional[str] = None):
+        self._name = name
+        self._package = package or name.split('.')[0]
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with profiler.measure(f"import {self._name}"):
+                try:
+                    self._module = importlib.import_module(self._name)
+                except ImportError as e:
+                    raise ImportError(
+                        f"{self._name} is required for this feature (pip install {self._package})"
+                    ) from e
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str, package: Optional[str] = None) -> LazyModule:
+    return LazyModule(name, package)
@@ -1,8 +1,15 @@
+from __future__ import annotations
+
 import numpy as np
-import open3d as o3d
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 import threading
 
+from coordinate_conversion import CoordinateConverter
+from landmarks import as_landmark_array
+from startup_profile import lazy_import
+
+o3d = lazy_import("open3d")
+
 
 class Visualizer3D:
     def __init__(self, window_name: str = "3D Recognition"):
@@ -32,7 +39,7 @@ class Visualizer3D:
                 self.vis.remove_geometry(self.point_cloud)
 
             self.point_cloud = o3d.geometry.PointCloud()
-            self.point_cloud.points = o3d.utility.Vector3dVector(points)
+            self.point_cloud.points = o3d.utility.Vector3dVector(np.asarray(points, dtype=np.float64))
 
             if colors is not None:
                 self.point_cloud.colors = o3d.utility.Vector3dVector(colors)
@@ -79,6 +86,21 @@ class PointCloudProcessor:
 
         return pcd
 
+    def create_from_depth(
+        self,
+        converter: CoordinateConverter,
+        depth_frame: np.ndarray,
+        color_frame: Optional[np.ndarray] = None,
+        stride: int = 1
+    ) -> o3d.geometry.PointCloud:
+        points, valid = converter.depth_to_point_cloud(depth_frame, stride=stride, return_mask=True)
+
+        colors = None
+        if color_frame is not None:
+            colors = color_frame[::stride, ::stride, ::-1].reshape(-1, 3)[valid] / 255.0
+
+        return self.create_from_arrays(np.asarray(points, dtype=np.float64), colors)
+
     def downsample(
         self,
         pcd: o3d.geometry.PointCloud,
@@ -151,11 +173,14 @@ class LandmarkVisualizer:
 
         return line_set
 
-    def visualize_hand_landmarks(self, landmarks_3d: List[Dict]) -> List:
+    def visualize_hand_landmarks(self, landmarks_3d: Union[np.ndarray, List[Dict]]) -> List:
+        landmarks_3d = as_landmark_array(landmarks_3d)
+        if landmarks_3d is None:
+            return []
+
         geometries = []
 
-        for landmark in landmarks_3d:
-            center = np.array([landmark['x'], landmark['y'], landmark['z']])
+        for center in landmarks_3d:
             sphere = self.create_sphere(center, self.joint_radius, self.colors['hand'])
             geometries.append(sphere)
 
@@ -170,9 +195,7 @@ class LandmarkVisualizer:
 
         for idx1, idx2 in hand_connections:
             if idx1 < len(landmarks_3d) and idx2 < len(landmarks_3d):
-                start = np.array([landmarks_3d[idx1]['x'], landmarks_3d[idx1]['y'], landmarks_3d[idx1]['z']])
-                end = np.array([landmarks_3d[idx2]['x'], landmarks_3d[idx2]['y'], landmarks_3d[idx2]['z']])
-                line = self.create_line(start, end, self.colors['hand'])
+                line = self.create_line(landmarks_3d[idx1], landmarks_3d[idx2], self.colors['hand'])
                 geometries.append(line)
 
         return geometries